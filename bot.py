@@ -7,6 +7,12 @@ from aiogram import Bot, Dispatcher
 
 from src.config import load_config, Config
 from src.setups import setup_bot, setup_dispathcer
+from src.webhook import run_webhook
+from src.google_queries import open_sheets, close_sheets, start_feedback_sinks, close_feedback_sinks
+from src.utils.genai import start_genai, close_genai
+from src.utils.candidates import close_candidate_buffer
+from src.utils.feedback_handlers import cancel_prefetches
+from src.utils.redis_registry import close_redis
 
 from fluentogram import TranslatorHub
 from src.utils.i18n import create_translator_hub
@@ -31,18 +37,36 @@ async def main() -> None:
 
     remove_logs()
 
+    await open_sheets(config)
+    start_feedback_sinks(config)
+    start_genai(config)
+
     try:
         print(f"{config.bot.name} is running...")
-        await dp.start_polling(
-            bot,
-            config=config,
-            _translator_hub=translator_hub
-            )
+        if config.webhook.enabled:
+            await run_webhook(
+                bot,
+                dp,
+                config,
+                _translator_hub=translator_hub
+                )
+        else:
+            await dp.start_polling(
+                bot,
+                config=config,
+                _translator_hub=translator_hub
+                )
         
     except Exception as e:
         logger.exception(e)
 
     finally:
+        await cancel_prefetches()
+        await close_genai()
+        await close_candidate_buffer()
+        await close_feedback_sinks()
+        await close_redis()
+        await close_sheets()
         await bot.session.close()
 
 
@@ -0,0 +1,128 @@
+"""
+Redis time of one /start action: the old sequence (LPUSH of the action,
+SADD, LINDEX + validation of the profile, LPUSH of the profile when it
+changed) against record_action, which does the same in one script call.
+
+Needs a Redis server; use a scratch database, the bench users are removed
+afterwards. --rtt puts a local proxy adding that round-trip time in front of
+the server, to see what a remote Redis would cost.
+
+    python -m scripts.bench_add_action --url redis://localhost:6379/15 --rtt 0.002
+"""
+import time
+import asyncio
+import argparse
+import statistics
+from urllib.parse import urlsplit, urlunsplit
+
+from redis.asyncio import Redis
+
+from src.queries import record_action, RECORD_ACTION
+from src.config import Config, ActionLog
+from src.custom_types import UserAction, UserData
+from src.enums import Action, RedisKeys
+from src.utils.action_log import user_stream
+from src.utils.profiles import profile_key, profile_log_key
+
+FIRST_ID = 900_000_000
+
+
+async def legacy_add_action(redis: Redis, action: str, user_data: UserData) -> None:
+    """add_action before the action streams: one round trip per command."""
+
+    await redis.lpush(f"{user_data.id}_a", UserAction(action_id=action).model_dump_json(indent=4))
+    await redis.sadd(RedisKeys.KNOWN_USERS.value, user_data.id)
+
+    current_raw = await redis.lindex(user_data.id, 0)
+    current = UserData.model_validate_json(current_raw) if current_raw else None
+    if current is None or current != user_data:
+        await redis.lpush(user_data.id, user_data.model_dump_json(indent=4))
+
+
+async def start_proxy(url: str, rtt: float) -> tuple[asyncio.AbstractServer, str]:
+    """TCP proxy delaying every chunk by half the round-trip time each way."""
+
+    parts = urlsplit(url)
+    host, port = parts.hostname or "localhost", parts.port or 6379
+
+    async def pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while chunk := await reader.read(65536):
+                await asyncio.sleep(rtt / 2)
+                writer.write(chunk)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(host, port)
+        try:
+            await asyncio.gather(pipe(client_reader, server_writer), pipe(server_reader, client_writer))
+        except (ConnectionError, asyncio.CancelledError):
+            # the benchmark is over
+            server_writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    proxy_port = server.sockets[0].getsockname()[1]
+    netloc = parts.netloc.rsplit("@", 1)[0] + "@" if "@" in parts.netloc else ""
+    return server, urlunsplit(parts._replace(netloc=f"{netloc}127.0.0.1:{proxy_port}"))
+
+
+async def measure(call, users: list[UserData]) -> list[float]:
+    samples = []
+    for user in users:
+        # the first /start stores the profile, the second finds it unchanged
+        for _ in range(2):
+            started = time.perf_counter()
+            await call(Action.START.value, user)
+            samples.append(time.perf_counter() - started)
+    return samples
+
+
+def report(name: str, samples: list[float]) -> None:
+    ms = sorted(s * 1000 for s in samples)
+    print(f"{name:>10}: mean {statistics.mean(ms):6.2f} ms  "
+          f"p50 {ms[len(ms) // 2]:6.2f} ms  p99 {ms[int(len(ms) * 0.99)]:6.2f} ms")
+
+
+async def main(args: argparse.Namespace) -> None:
+    proxy = None
+    url = args.url
+    if args.rtt:
+        proxy, url = await start_proxy(args.url, args.rtt)
+
+    redis = Redis.from_url(url)
+    config = Config.model_construct(action_log=ActionLog())
+    users = [UserData(id=FIRST_ID + i, first_name=f"Bench {i}", language_code="ru") for i in range(args.users)]
+
+    # entries of the global stream from here on can be the bench's
+    seconds, microseconds = await redis.time()
+    started_id = f"{seconds * 1000 + microseconds // 1000}-0"
+
+    try:
+        # load the script before timing
+        await redis.script_load(RECORD_ACTION)
+
+        report("before", await measure(lambda action, user: legacy_add_action(redis, action, user), users))
+        report("after", await measure(lambda action, user: record_action(redis, config, action, user), users))
+    finally:
+        for user in users:
+            await redis.delete(
+                f"{user.id}_a", user.id, user_stream(user.id), profile_key(user.id), profile_log_key(user.id))
+            await redis.srem(RedisKeys.KNOWN_USERS.value, user.id)
+        # the global stream is shared, drop only the bench entries
+        bench_ids = {str(user.id).encode() for user in users}
+        for entry_id, fields in await redis.xrange(RedisKeys.ACTIONS.value, min=started_id):
+            if fields.get(b"u") in bench_ids:
+                await redis.xdel(RedisKeys.ACTIONS.value, entry_id)
+        await redis.aclose()
+        if proxy is not None:
+            proxy.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="redis://localhost:6379/15")
+    parser.add_argument("--rtt", type=float, default=0.0)
+    parser.add_argument("--users", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,172 @@
+"""
+Cold catalog load against a fake Sheets API with a fixed round-trip time.
+
+Compares the old /start read sequence (six dependent requests) with
+load_catalog, which reads the same data through a SheetsFetchPlan.
+
+With --redis, also compares building every teacher's start_data from the
+loaded snapshot (what /start does) with a GET of a start_data precomputed in
+Redis per user id and catalog version, for the whole roster plus a stranger.
+Use a scratch database; the bench keys are removed afterwards.
+
+    python -m scripts.bench_catalog_fetch --rtt 0.08 --runs 20
+    python -m scripts.bench_catalog_fetch --teachers 500 --redis redis://localhost:6379/15
+"""
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+import httpx
+from redis.asyncio import Redis
+
+from src import google_queries
+from src.config import Config, Google
+from src.enums import DialogDataKeys
+from src.utils.sheets_async import SheetsAsync
+
+from scripts.fakes import FakeSheetsTransport, FakeAuth
+
+TEACHERS_ID, CONTENT_ID, PROMPTS_ID = "teachers", "content", "prompts"
+
+
+def build_workbooks(teachers: int, disciplines: int, tasks: int) -> dict:
+    discipline_rows = [["Дисциплина", "id"]] + [[f"Дисциплина {d}", f"disc{d}"] for d in range(disciplines)]
+    discipline_rows.append(["Демо: Финмоделирование", "demo"])
+    teacher_rows = [["Имя", "id", "Дисциплины"]]
+    for t in range(teachers):
+        names = ", ".join(f"Дисциплина {(t + k) % disciplines}" for k in range(2))
+        teacher_rows.append([f"Преподаватель {t}", str(1000 + t), names])
+    # A:C holds the teachers and E:F the discipline mapping of the same tab
+    accesses = [
+        (teacher_rows[i] if i < len(teacher_rows) else ["", "", ""]) + [""]
+        + (discipline_rows[i] if i < len(discipline_rows) else [])
+        for i in range(max(len(teacher_rows), len(discipline_rows)))
+    ]
+
+    content = {"syllabus": [["Дисциплина", "", "Силлабус"]]}
+    for name, discipline_id in discipline_rows[1:]:
+        content["syllabus"].append([name, "", "Текст силлабуса. " * 200])
+        content[discipline_id] = [["Задача", "id", "Описание"]] + [
+            [f"Задача {k}", f"task{k}", "Описание задачи. " * 50] for k in range(tasks)
+        ]
+
+    prompts = {"prompts": [[""] * 10 + [v] for v in ["Промпт", "v1", "v2", "0.7", "Системный промпт. " * 300]]}
+    return {
+        TEACHERS_ID: {"accesses": accesses},
+        CONTENT_ID: content,
+        PROMPTS_ID: prompts,
+    }
+
+
+def build_config() -> Config:
+    return Config.model_construct(google=Google(
+        feedbacks_and_accesses_id=TEACHERS_ID,
+        accesses_tab="accesses",
+        content_id=CONTENT_ID,
+        content_tab="content",
+        syllabus_tab="syllabus",
+        prompt_id=PROMPTS_ID,
+        prompt_tab="prompts",
+        service_account_json="unused.json",
+    ))
+
+
+async def legacy_start(config: Config, teachers: SheetsAsync, content: SheetsAsync, prompts: SheetsAsync, user_id: int):
+    """The read sequence /start used to make for one teacher."""
+    accesses = await teachers.read(f"{config.google.accesses_tab}!A1:C")
+    row = next(r for r in accesses["values"][1:] if r[1] == str(user_id))
+    discs = dict((el[0], el[1]) for el in (await teachers.read(f"{config.google.accesses_tab}!E1:F"))["values"][1:])
+    await content.read(f"{config.google.syllabus_tab}!A2:C")
+    meta = await content.get_spreadsheet()
+    tabs = {s["properties"]["title"] for s in meta["sheets"]}
+    ranges = [f"{discs[d]}!A2:C" for d in row[2].split(", ") if discs.get(d) in tabs]
+    await content.batch_get(ranges)
+    await prompts.read(f"{config.google.prompt_tab}!K2:K")
+
+
+async def bench_start_data(snapshot, user_ids: list[int], url: str) -> None:
+    """In-process start_data against a precomputed copy read back from Redis, per /start."""
+
+    def key(user_id: int) -> str:
+        return f"bench_start_data:{snapshot.version}:{user_id}"
+
+    built = []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        google_queries.get_data_for_dialog(snapshot, user_id)
+        built.append(time.perf_counter() - started)
+
+    redis = Redis.from_url(url)
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.set(key(user_id), json.dumps(google_queries.get_data_for_dialog(snapshot, user_id)))
+            await pipe.execute()
+
+        fetched = []
+        for user_id in user_ids:
+            started = time.perf_counter()
+            start_data = json.loads(await redis.get(key(user_id)))
+            assert start_data[DialogDataKeys.CATALOG_VERSION] == snapshot.version
+            fetched.append(time.perf_counter() - started)
+    finally:
+        await redis.delete(*(key(user_id) for user_id in user_ids))
+        await redis.aclose()
+
+    print(f"start_data for {len(user_ids)} users:")
+    for name, samples in (("in-process", built), ("redis GET", fetched)):
+        print(f"{name:>11}: median {statistics.median(samples) * 1e6:7.1f} us, max {max(samples) * 1e6:7.1f} us")
+
+
+async def main(args: argparse.Namespace) -> None:
+    config = build_config()
+    transport = FakeSheetsTransport(build_workbooks(args.teachers, args.disciplines, args.tasks), rtt=args.rtt)
+    client = httpx.AsyncClient(transport=transport)
+
+    def make(spreadsheet_id: str) -> SheetsAsync:
+        return SheetsAsync(
+            spreadsheet_id, "unused.json", client=client, auth=FakeAuth(),
+            read_per_minute=10 ** 6, write_per_minute=10 ** 6, max_in_flight=64)
+
+    sheets = make(TEACHERS_ID), make(CONTENT_ID), make(PROMPTS_ID)
+    google_queries._teachers_sheets_instance, google_queries._content_sheets_instance, google_queries._prompts_sheets_instance = sheets
+
+    async def timed(coro_factory) -> list[float]:
+        samples = []
+        for _ in range(args.runs):
+            transport.calls.clear()
+            started = time.perf_counter()
+            await coro_factory()
+            samples.append(time.perf_counter() - started)
+        return samples
+
+    legacy = await timed(lambda: legacy_start(config, *sheets, user_id=1000))
+    legacy_calls = sum(transport.calls.values())
+    planned = await timed(lambda: google_queries.load_catalog(config, None))
+    planned_calls = sum(transport.calls.values())
+
+    print(f"rtt={args.rtt * 1000:.0f} ms, teachers={args.teachers}, disciplines={args.disciplines}")
+    for name, samples, calls in (("sequential", legacy, legacy_calls), ("fetch plan", planned, planned_calls)):
+        print(f"{name:>11}: median {statistics.median(samples) * 1000:7.1f} ms, "
+              f"max {max(samples) * 1000:7.1f} ms, {calls} requests")
+
+    if args.redis:
+        snapshot = await google_queries.load_catalog(config, None)
+        # the whole roster and one stranger, who gets the demo discipline
+        user_ids = [1000 + t for t in range(args.teachers)] + [1]
+        await bench_start_data(snapshot, user_ids, args.redis)
+
+    await client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rtt", type=float, default=0.08)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--teachers", type=int, default=200)
+    parser.add_argument("--disciplines", type=int, default=12)
+    parser.add_argument("--tasks", type=int, default=8)
+    parser.add_argument("--redis", help="Redis URL (scratch db) to compare start_data with a precomputed copy")
+    asyncio.run(main(parser.parse_args()))
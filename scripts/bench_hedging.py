@@ -0,0 +1,94 @@
+"""
+generate_feedback latency with and without hedging against FakeGenAIClient
+with a heavy-tailed latency: most calls take ~median, a few take many times
+longer.
+
+    python -m scripts.bench_hedging --requests 400 --slow-share 0.05
+"""
+import random
+import asyncio
+import argparse
+import statistics
+
+from src.utils import genai
+from src.config import Config, LLM, ContextCache, ResponseCache, Hedging
+from src.enums import DialogDataKeys
+
+from scripts.fakes import FakeGenAIClient
+
+DATA = {
+    DialogDataKeys.PROMPT: "Системный промпт.",
+    DialogDataKeys.TEMPERATURE: "0.7",
+    DialogDataKeys.SYLLABUS: "Силлабус.",
+    DialogDataKeys.DISCIPLINE_NAME: "Матметоды",
+    DialogDataKeys.TASK_NAME: "Задача 1",
+    DialogDataKeys.TASK_DESCRIPTION: "Описание",
+    DialogDataKeys.TEXT_FROM_TEACHER: "Хорошая работа",
+}
+
+
+async def run(args: argparse.Namespace, hedging: Hedging) -> list[float]:
+    rng = random.Random(args.seed)
+
+    def latency() -> float:
+        base = rng.lognormvariate(0, 0.25) * args.median
+        return base * args.slow_factor if rng.random() < args.slow_share else base
+
+    client = FakeGenAIClient(latency=latency)
+    config = Config.model_construct(
+        gemini=LLM(api_key="fake", model="gemini-test", provider="google", embedding_model="none"),
+        context_cache=ContextCache(enabled=False),
+        response_cache=ResponseCache(enabled=False),
+        hedging=hedging)
+
+    genai._get_client = lambda api_key: client
+    genai._hedger_instances.clear()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    samples = []
+
+    async def one():
+        async with semaphore:
+            started = asyncio.get_running_loop().time()
+            await genai.generate_feedback(config, DATA)
+            samples.append(asyncio.get_running_loop().time() - started)
+
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    return samples
+
+
+def report(name: str, samples: list[float]) -> None:
+    ordered = sorted(samples)
+    print(f"{name:>8}: p50 {statistics.median(ordered) * 1000:6.0f} ms, "
+          f"p95 {ordered[int(len(ordered) * 0.95) - 1] * 1000:6.0f} ms, "
+          f"p99 {ordered[int(len(ordered) * 0.99) - 1] * 1000:6.0f} ms, "
+          f"max {ordered[-1] * 1000:6.0f} ms")
+
+
+async def main(args: argparse.Namespace) -> None:
+    plain = await run(args, Hedging(enabled=False))
+    hedged = await run(args, Hedging(
+        enabled=True, percentile=args.percentile, initial_delay=args.median * 3,
+        min_delay=args.median, min_samples=20))
+
+    print(f"{args.requests} requests, median {args.median * 1000:.0f} ms, "
+          f"{args.slow_share:.0%} x{args.slow_factor:g} slow, hedge at p{args.percentile:g}")
+    report("plain", plain)
+    report("hedged", hedged)
+
+    hedger = genai._hedger_instances[genai.HEDGE_GENERATE]
+    stats = hedger.hedge_stats
+    print(f"{'stats':>8}: {stats}, final delay {hedger.delay() * 1000:.0f} ms, "
+          f"{stats['hedge_rate']:.0%} extra calls")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--median", type=float, default=0.05)
+    parser.add_argument("--slow-share", type=float, default=0.05)
+    parser.add_argument("--slow-factor", type=float, default=8)
+    parser.add_argument("--percentile", type=float, default=90)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,81 @@
+"""
+Per-update cost of reading the bot, config and user from the middleware data:
+the old get_middleware_data, which validated a new UserData on every call,
+against RequestContextMiddleware building it once. --calls is how many times
+one update reads it (a feedback button press does about six).
+
+    python -m scripts.bench_request_context --calls 6 --updates 20000
+"""
+import time
+import asyncio
+import argparse
+from types import SimpleNamespace
+
+from aiogram.types import User
+
+from my_tools import DialogManagerKeys
+
+from src.config import Config
+from src.custom_types import UserData
+from src.middlewares.request_context import RequestContextMiddleware
+from src.utils.utils import get_middleware_data
+
+
+def legacy_get_middleware_data(dialog_manager) -> tuple:
+
+    bot = dialog_manager.middleware_data[DialogManagerKeys.BOT]
+    config = dialog_manager.middleware_data.get(DialogManagerKeys.CONFIG)
+    event_from_user = dialog_manager.middleware_data.get(DialogManagerKeys.EVENT_FROM_USER)
+
+    return bot, config, UserData(**event_from_user.model_dump())
+
+
+DATA = {
+    DialogManagerKeys.BOT.value: object(),
+    DialogManagerKeys.CONFIG.value: Config.model_construct(),
+    DialogManagerKeys.EVENT_FROM_USER.value: User(
+        id=123456789, is_bot=False, first_name="Анна", last_name="Иванова", username="anna", language_code="ru"),
+}
+
+
+def new_data() -> dict:
+    # every update gets a fresh middleware data dict
+    return dict(DATA)
+
+
+async def legacy_update(calls: int) -> None:
+    dialog_manager = SimpleNamespace(middleware_data=new_data())
+    for _ in range(calls):
+        legacy_get_middleware_data(dialog_manager)
+
+
+async def context_update(calls: int) -> None:
+    middleware = RequestContextMiddleware()
+
+    async def handler(event, data):
+        dialog_manager = SimpleNamespace(middleware_data=data)
+        for _ in range(calls):
+            get_middleware_data(dialog_manager)
+
+    await middleware(handler, None, new_data())
+
+
+async def measure(update, args: argparse.Namespace) -> float:
+
+    started = time.perf_counter()
+    for _ in range(args.updates):
+        await update(args.calls)
+    return (time.perf_counter() - started) / args.updates
+
+
+async def main(args: argparse.Namespace) -> None:
+    for name, update, built in (("before", legacy_update, args.calls), ("after", context_update, 1)):
+        per_update = await measure(update, args)
+        print(f"{name:>8}: {per_update * 1e6:6.1f} µs per update, {built} UserData validated")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=6)
+    parser.add_argument("--updates", type=int, default=20000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,159 @@
+"""
+Offline check of the Gemini context cache lifecycle against FakeGenAIClient.
+
+    python -m scripts.check_context_cache
+"""
+import time
+import asyncio
+
+from google.genai.errors import ClientError
+
+from src.utils import genai
+from src.utils.genai_cache import ContextCacheManager
+from src.config import Config, LLM, ContextCache, ResponseCache
+from src.enums import DialogDataKeys
+
+from scripts.fakes import FakeGenAIClient
+
+MODEL = "gemini-test"
+PROMPT = "Системный промпт. " * 200
+SYLLABUS = "Силлабус. " * 300
+
+
+async def check_manager() -> None:
+    client = FakeGenAIClient(min_cache_chars=1000)
+    caches = client.aio.caches
+    manager = ContextCacheManager(client, ttl=3600, refresh_margin=300, negative_ttl=900)
+
+    name = await manager.get(MODEL, PROMPT, "Матметоды", SYLLABUS)
+    assert name is not None and caches.calls["create"] == 1
+    assert await manager.get(MODEL, PROMPT, "Матметоды", SYLLABUS) == name
+    assert caches.calls["create"] == 1, "served from memory"
+
+    # a new prompt version or another discipline gets its own cache
+    assert await manager.get(MODEL, PROMPT + "v2", "Матметоды", SYLLABUS) != name
+    assert await manager.get(MODEL, PROMPT, "Финмоделирование", SYLLABUS) != name
+    assert caches.calls["create"] == 3
+
+    # close to expiry: extended in place, not recreated
+    key = next(k for k, v in manager._entries.items() if v[0] == name)
+    manager._entries[key] = (name, time.monotonic() + 60)
+    assert await manager.get(MODEL, PROMPT, "Матметоды", SYLLABUS) == name
+    assert caches.calls["update"] == 1 and caches.calls["create"] == 3
+
+    # deleted on the server side: extension fails, a new cache is created
+    await caches.delete(name=name)
+    manager._entries[key] = (name, time.monotonic() + 60)
+    renewed = await manager.get(MODEL, PROMPT, "Матметоды", SYLLABUS)
+    assert renewed not in (None, name) and caches.calls["create"] == 4
+
+    # too small to cache: inline, and not retried while the negative entry lives
+    assert await manager.get(MODEL, "short", "Демо", "tiny") is None
+    assert await manager.get(MODEL, "short", "Демо", "tiny") is None
+    assert caches.calls["create"] == 5
+
+    await manager.clear()
+    assert not caches.store
+    print("ContextCacheManager: ok", dict(caches.calls))
+
+
+async def check_generate_feedback() -> None:
+    client = FakeGenAIClient(min_cache_chars=1000)
+    config = Config.model_construct(
+        gemini=LLM(api_key="fake", model=MODEL, provider="google", embedding_model="none"),
+        context_cache=ContextCache(),
+        response_cache=ResponseCache(enabled=False))
+
+    genai._get_client = lambda api_key: client
+    genai._context_cache_instance = None
+
+    data = {
+        DialogDataKeys.PROMPT: PROMPT,
+        DialogDataKeys.TEMPERATURE: "0.7",
+        DialogDataKeys.SYLLABUS: SYLLABUS,
+        DialogDataKeys.DISCIPLINE_NAME: "Матметоды",
+        DialogDataKeys.TASK_NAME: "Задача 1",
+        DialogDataKeys.TASK_DESCRIPTION: "Описание",
+        DialogDataKeys.TEXT_FROM_TEACHER: "Хорошая работа",
+    }
+
+    await genai.generate_feedback(config, data)
+    await genai.generate_feedback(config, data)
+    requests = client.aio.models.requests
+    assert all(r["config"].cached_content and r["config"].system_instruction is None for r in requests)
+    assert all(not any("<sullabus>" in c for c in r["contents"]) for r in requests)
+    assert client.aio.caches.calls["create"] == 1
+
+    # the cache disappears behind our back: the request falls back to inline content
+    client.aio.caches.store.clear()
+    await genai.generate_feedback(config, data)
+    last = requests[-1]
+    assert last["config"].cached_content is None and last["config"].system_instruction == PROMPT
+
+    # rate limited: raised as is, the cache is kept and nothing is sent inline
+    name = await genai._context_cache_name(config, data)
+    sent = len(requests)
+    client.aio.models.errors.append(
+        ClientError(429, {"error": {"code": 429, "message": "Resource exhausted", "status": "RESOURCE_EXHAUSTED"}}))
+    try:
+        await genai.generate_feedback(config, data, use_cache=False)
+        raise AssertionError("the 429 was swallowed")
+    except ClientError as e:
+        assert e.code == 429
+    assert len(requests) == sent and await genai._context_cache_name(config, data) == name
+    print("generate_feedback: ok", f"{len(requests)} requests")
+
+
+async def check_stream_feedback() -> None:
+    client = FakeGenAIClient(min_cache_chars=1000)
+    config = Config.model_construct(
+        gemini=LLM(api_key="fake", model=MODEL, provider="google", embedding_model="none"),
+        context_cache=ContextCache(),
+        response_cache=ResponseCache(enabled=False))
+
+    genai._get_client = lambda api_key: client
+    genai._context_cache_instance = None
+
+    data = {
+        DialogDataKeys.PROMPT: PROMPT,
+        DialogDataKeys.TEMPERATURE: "0.7",
+        DialogDataKeys.SYLLABUS: SYLLABUS,
+        DialogDataKeys.DISCIPLINE_NAME: "Матметоды",
+        DialogDataKeys.TASK_NAME: "Задача 1",
+        DialogDataKeys.TASK_DESCRIPTION: "Описание",
+        DialogDataKeys.TEXT_FROM_TEACHER: "Хорошая работа",
+    }
+
+    parts = [text async for text in genai.stream_feedback(config, data)]
+    assert len(parts) > 1 and all(b.startswith(a) for a, b in zip(parts, parts[1:]))
+    assert client.aio.models.requests[-1]["config"].cached_content
+
+    # a rejected cache before the first chunk: streamed again inline
+    client.aio.caches.store.clear()
+    inline = [text async for text in genai.stream_feedback(config, data)]
+    assert len(inline) == len(parts)
+    assert client.aio.models.requests[-1]["config"].cached_content is None
+
+    # rate limited before the first chunk: raised, not retried inline
+    sent = len(client.aio.models.requests)
+    client.aio.models.errors.append(
+        ClientError(429, {"error": {"code": 429, "message": "Resource exhausted", "status": "RESOURCE_EXHAUSTED"}}))
+    try:
+        [text async for text in genai.stream_feedback(config, data, use_cache=False)]
+        raise AssertionError("the 429 was swallowed")
+    except ClientError as e:
+        assert e.code == 429
+    assert len(client.aio.models.requests) == sent
+
+    # several candidates in one stream: the first is streamed, the others come along
+    streamed = [texts async for texts in genai.stream_feedback_candidates(config, data, 3, use_cache=False)]
+    assert client.aio.models.requests[-1]["config"].candidate_count == 3
+    assert all(len(texts) == 3 for texts in streamed)
+    assert len(set(streamed[-1])) == 3 and all(streamed[-1])
+    print("stream_feedback: ok", f"{len(parts)} chunks")
+
+
+if __name__ == "__main__":
+    asyncio.run(check_manager())
+    asyncio.run(check_generate_feedback())
+    asyncio.run(check_stream_feedback())
@@ -0,0 +1,160 @@
+"""
+Offline check of LLMScheduler slot handover, including jobs cancelled while
+a slot is handed to them.
+
+    python -m scripts.check_llm_scheduler
+"""
+import asyncio
+
+from src.utils.llm_scheduler import LLMScheduler, QueueFull, FRESH, REDO, BACKGROUND
+
+TIMEOUT = 1.0
+
+
+async def hold(scheduler: LLMScheduler, user_id: int, release: asyncio.Event, order: list[int], priority: int = FRESH) -> None:
+    async with scheduler.slot(user_id, priority):
+        order.append(user_id)
+        await release.wait()
+
+
+async def check_order() -> None:
+    scheduler = LLMScheduler(max_concurrent=1, max_queue=10, max_per_user=5)
+    release, order = asyncio.Event(), []
+
+    first = asyncio.create_task(hold(scheduler, 1, release, order))
+    await asyncio.sleep(0)
+    queued = [
+        asyncio.create_task(hold(scheduler, 2, release, order, REDO)),
+        asyncio.create_task(hold(scheduler, 3, release, order)),
+        asyncio.create_task(hold(scheduler, 3, release, order)),
+        asyncio.create_task(hold(scheduler, 4, release, order)),
+    ]
+    await asyncio.sleep(0)
+    assert scheduler.running == 1 and scheduler.waiting == 4
+
+    release.set()
+    await asyncio.wait_for(asyncio.gather(first, *queued), TIMEOUT)
+    # fresh before redo, users take turns
+    assert order == [1, 3, 4, 3, 2], order
+    assert scheduler.running == 0 and scheduler.waiting == 0
+
+
+async def check_cancel_on_handover() -> None:
+    """The next job is cancelled in the same tick the running one lets its slot go."""
+
+    scheduler = LLMScheduler(max_concurrent=1, max_queue=10, max_per_user=5)
+    order = []
+
+    running = scheduler.slot(1)
+    await running.__aenter__()
+    cancelled = asyncio.create_task(hold(scheduler, 2, asyncio.Event(), order))
+    after = asyncio.create_task(hold(scheduler, 3, asyncio.Event(), order))
+    await asyncio.sleep(0)
+    assert scheduler.waiting == 2
+
+    cancelled.cancel()
+    await running.__aexit__(None, None, None)
+    await asyncio.gather(cancelled, return_exceptions=True)
+
+    # the slot went to the job after the cancelled one
+    await asyncio.sleep(0)
+    assert order == [3], order
+    assert scheduler.running == 1 and scheduler.waiting == 0
+
+    after.cancel()
+    await asyncio.gather(after, return_exceptions=True)
+    assert scheduler.running == 0
+
+    # and the scheduler still works
+    release = asyncio.Event()
+    release.set()
+    await asyncio.wait_for(hold(scheduler, 4, release, order), TIMEOUT)
+    assert scheduler.running == 0 and scheduler.waiting == 0
+
+
+async def check_cancel_after_handover() -> None:
+    """The next job is cancelled right after it was given the slot, before it ran."""
+
+    scheduler = LLMScheduler(max_concurrent=1, max_queue=10, max_per_user=5)
+    order = []
+
+    running = scheduler.slot(1)
+    await running.__aenter__()
+    handed = asyncio.create_task(hold(scheduler, 2, asyncio.Event(), order))
+    after = asyncio.create_task(hold(scheduler, 3, asyncio.Event(), order))
+    await asyncio.sleep(0)
+
+    await running.__aexit__(None, None, None)
+    handed.cancel()
+    await asyncio.gather(handed, return_exceptions=True)
+
+    # the job gave the slot back, and the one after it got it
+    await asyncio.sleep(0)
+    assert order == [3], order
+    assert scheduler.running == 1 and scheduler.waiting == 0
+
+    after.cancel()
+    await asyncio.gather(after, return_exceptions=True)
+    assert scheduler.running == 0 and scheduler.waiting == 0
+
+
+async def check_cancel_while_queued() -> None:
+    scheduler = LLMScheduler(max_concurrent=1, max_queue=10, max_per_user=5)
+    release, order = asyncio.Event(), []
+
+    first = asyncio.create_task(hold(scheduler, 1, release, order))
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(hold(scheduler, 2, release, order))
+    await asyncio.sleep(0)
+
+    queued.cancel()
+    await asyncio.gather(queued, return_exceptions=True)
+    assert scheduler.waiting == 0
+
+    release.set()
+    await asyncio.wait_for(first, TIMEOUT)
+    assert order == [1] and scheduler.running == 0
+
+
+async def check_background_share() -> None:
+    """A queued background job neither uses up its user's share nor runs before the user's own job."""
+
+    scheduler = LLMScheduler(max_concurrent=1, max_queue=10, max_per_user=1)
+    release, order = asyncio.Event(), []
+
+    async def tagged(tag: str, priority: int) -> None:
+        async with scheduler.slot(2, priority):
+            order.append(tag)
+            await release.wait()
+
+    first = asyncio.create_task(hold(scheduler, 1, release, order))
+    await asyncio.sleep(0)
+    background = asyncio.create_task(tagged("background", BACKGROUND))
+    await asyncio.sleep(0)
+    own = asyncio.create_task(tagged("redo", REDO))
+    await asyncio.sleep(0)
+    assert scheduler.waiting == 2
+
+    try:
+        await scheduler.slot(2).__aenter__()
+        raise AssertionError("the user's share is one queued job")
+    except QueueFull:
+        pass
+
+    release.set()
+    await asyncio.wait_for(asyncio.gather(first, background, own), TIMEOUT)
+    assert order == [1, "redo", "background"], order
+    assert scheduler.running == 0 and scheduler.waiting == 0
+
+
+async def main() -> None:
+    checks = (
+        check_order, check_cancel_on_handover, check_cancel_after_handover, check_cancel_while_queued,
+        check_background_share)
+    for check in checks:
+        await check()
+        print(f"{check.__name__}: ok")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""
+Offline check of the voice note paths in src/utils/genai.py against FakeGenAIClient.
+
+    python -m scripts.check_voice
+"""
+import io
+import time
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from src.utils import genai
+from src.utils.genai_files import FileJanitor
+from src.config import Config, LLM, Audio, ContextCache, ResponseCache
+from src.enums import DialogDataKeys
+
+from scripts.fakes import FakeGenAIClient
+
+MODEL = "gemini-test"
+LATENCY = 0.05
+
+
+async def check_transcript() -> None:
+    client = FakeGenAIClient(latency=LATENCY)
+    config = Config.model_construct(
+        gemini=LLM(api_key="fake", model=MODEL, provider="google", embedding_model="none"),
+        audio=Audio(inline_max_bytes=1024))
+
+    genai._get_client = lambda api_key: client
+    files, requests = client.aio.files, client.aio.models.requests
+
+    start = time.perf_counter()
+    await genai.generate_transcript(config, io.BytesIO(b"\x00" * 512))
+    inline_ms = (time.perf_counter() - start) * 1000
+    assert files.calls["upload"] == 0
+    assert requests[-1]["contents"][1].inline_data.data == b"\x00" * 512
+
+    start = time.perf_counter()
+    await genai.generate_transcript(config, io.BytesIO(b"\x00" * 4096))
+    upload_ms = (time.perf_counter() - start) * 1000
+    assert files.calls["upload"] == 1 and files.calls["delete"] == 1
+    assert not files.store, "uploaded file deleted after use"
+
+    print(f"generate_transcript: ok, inline {inline_ms:.0f} ms, upload {upload_ms:.0f} ms")
+
+
+async def check_voice_feedback() -> None:
+    client = FakeGenAIClient(min_cache_chars=1000, latency=LATENCY)
+    config = Config.model_construct(
+        gemini=LLM(api_key="fake", model=MODEL, provider="google", embedding_model="none"),
+        audio=Audio(inline_max_bytes=1024, one_shot=True),
+        context_cache=ContextCache(),
+        response_cache=ResponseCache(enabled=False))
+
+    genai._get_client = lambda api_key: client
+    genai._context_cache_instance = None
+    requests = client.aio.models.requests
+
+    data = {
+        DialogDataKeys.PROMPT: "Системный промпт. " * 100,
+        DialogDataKeys.TEMPERATURE: "0.7",
+        DialogDataKeys.SYLLABUS: "Силлабус. " * 100,
+        DialogDataKeys.DISCIPLINE_NAME: "Матметоды",
+        DialogDataKeys.TASK_NAME: "Задача 1",
+        DialogDataKeys.TASK_DESCRIPTION: "Описание",
+    }
+
+    # review-then-send: transcript, then feedback
+    start = time.perf_counter()
+    data[DialogDataKeys.TEXT_FROM_TEACHER] = await genai.generate_transcript(config, io.BytesIO(b"\x00" * 512))
+    await genai.generate_feedback(config, data)
+    two_step_ms = (time.perf_counter() - start) * 1000
+    two_step = len(requests)
+
+    start = time.perf_counter()
+    result = await genai.generate_voice_feedback(config, data, io.BytesIO(b"\x00" * 512))
+    one_shot_ms = (time.perf_counter() - start) * 1000
+    assert result.transcript and result.feedback
+    assert len(requests) - two_step == 1
+    assert requests[-1]["config"].cached_content and requests[-1]["config"].response_schema is not None
+
+    # large voice note: uploaded for the request and deleted afterwards
+    await genai.generate_voice_feedback(config, data, io.BytesIO(b"\x00" * 4096))
+    assert client.aio.files.calls["upload"] == 1 and not client.aio.files.store
+
+    print(f"generate_voice_feedback: ok, {two_step} calls {two_step_ms:.0f} ms -> 1 call {one_shot_ms:.0f} ms")
+
+
+async def check_janitor() -> None:
+    client = FakeGenAIClient()
+    files = client.aio.files
+    janitor = FileJanitor(client, interval=3600, max_age=3600)
+
+    fresh = await files.upload(file=None, config=genai.UploadFileConfig(mime_type="audio/ogg", display_name="voice.ogg"))
+    old = await files.upload(file=None, config=genai.UploadFileConfig(mime_type="audio/ogg", display_name="voice.ogg"))
+    other = await files.upload(file=None, config=genai.UploadFileConfig(mime_type="text/plain", display_name="notes.txt"))
+    old.create_time = other.create_time = datetime.now(timezone.utc) - timedelta(hours=2)
+
+    assert await janitor.sweep() == 1
+    assert set(files.store) == {fresh.name, other.name}
+    print("FileJanitor: ok")
+
+
+if __name__ == "__main__":
+    asyncio.run(check_transcript())
+    asyncio.run(check_voice_feedback())
+    asyncio.run(check_janitor())
@@ -0,0 +1,339 @@
+"""
+Local stand-ins for the remote services, used by the benchmark and check scripts.
+
+FakeSheetsTransport plugs into httpx.AsyncClient(transport=...) and serves the
+subset of the Sheets v4 API that SheetsAsync uses from in-memory workbooks,
+with a fixed simulated round-trip time per request. FakeGenAIClient replaces
+google.genai.Client for the Gemini calls. FakeTelegramSession serves getMe
+and getUpdates to a Bot from a queue of synthetic updates.
+"""
+import re
+import json
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Callable
+from collections import Counter
+from urllib.parse import unquote
+
+import httpx
+from aiogram import Bot
+from aiogram.methods import GetMe, GetUpdates, TelegramMethod
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Update, User
+from google.genai.errors import ClientError
+from google.genai.types import \
+    CachedContent, CreateCachedContentConfig, UpdateCachedContentConfig, GenerateContentConfig, File
+
+_A1 = re.compile(r"^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$")
+
+
+def _col(letters: str, default: int) -> int:
+    if not letters:
+        return default
+    n = 0
+    for ch in letters:
+        n = n * 26 + (ord(ch) - 64)
+    return n - 1
+
+
+def split_a1(a1_range: str) -> tuple[str, str]:
+    if "!" not in a1_range:
+        return a1_range.strip("'"), ""
+    title, cells = a1_range.rsplit("!", 1)
+    if title.startswith("'"):
+        title = title[1:-1].replace("''", "'")
+    return title, cells
+
+
+def slice_a1(rows: list[list], cells: str) -> list[list]:
+    if not cells:
+        return rows
+    m = _A1.match(cells)
+    c0, r0, c1, r1 = m.groups()
+    first_row = int(r0) - 1 if r0 else 0
+    first_col = _col(c0, 0)
+    if c1 is None and r1 is None:
+        last_row = first_row + 1 if r0 else len(rows)
+        last_col = first_col + 1
+    else:
+        last_row = int(r1) if r1 else len(rows)
+        last_col = _col(c1, 10 ** 6) + 1
+    out = [row[first_col:last_col] for row in rows[first_row:last_row]]
+    while out and not out[-1]:
+        out.pop()
+    return out
+
+
+class FakeSheetsTransport(httpx.AsyncBaseTransport):
+    """In-memory Sheets API: {spreadsheet_id: {tab title: rows}}."""
+
+    def __init__(self, workbooks: dict[str, dict[str, list[list]]], rtt: float = 0.05):
+        self.workbooks = workbooks
+        self.rtt = rtt
+        self.calls: Counter = Counter()
+        self._sheet_ids: dict[tuple[str, str], int] = {}
+        for spreadsheet_id, tabs in workbooks.items():
+            for title in tabs:
+                self._sheet_id(spreadsheet_id, title)
+
+    def _sheet_id(self, spreadsheet_id: str, title: str) -> int:
+        return self._sheet_ids.setdefault((spreadsheet_id, title), len(self._sheet_ids) + 1)
+
+    def _title_by_id(self, spreadsheet_id: str, sheet_id: int) -> str | None:
+        for (sid, title), value in self._sheet_ids.items():
+            if sid == spreadsheet_id and value == sheet_id:
+                return title
+        return None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self.rtt)
+
+        path = unquote(request.url.path).split("/v4/spreadsheets/", 1)[1]
+        head, _, tail = path.partition("/")
+        spreadsheet_id, _, action = head.partition(":")
+        book = self.workbooks.setdefault(spreadsheet_id, {})
+        body = json.loads(request.content) if request.content else {}
+
+        if action:
+            self.calls[action] += 1
+        elif not tail:
+            self.calls["metadata"] += 1
+        elif tail == "values:batchGet":
+            self.calls["batchGet"] += 1
+        else:
+            self.calls["append" if tail.endswith(":append") else "values"] += 1
+
+        if request.method == "GET" and not tail and not action:
+            sheets = [
+                {"properties": {"title": title, "sheetId": self._sheet_id(spreadsheet_id, title)}}
+                for title in book
+            ]
+            return httpx.Response(200, json={"sheets": sheets})
+
+        if request.method == "POST" and action == "batchUpdate":
+            replies = []
+            for req in body.get("requests", []):
+                if "addSheet" in req:
+                    title = req["addSheet"]["properties"]["title"]
+                    book.setdefault(title, [])
+                    sheet_id = self._sheet_id(spreadsheet_id, title)
+                    replies.append({"addSheet": {"properties": {"title": title, "sheetId": sheet_id}}})
+                elif "appendCells" in req:
+                    title = self._title_by_id(spreadsheet_id, req["appendCells"]["sheetId"])
+                    if title is None:
+                        return httpx.Response(400, json={"error": "no such sheet"})
+                    for row in req["appendCells"]["rows"]:
+                        book[title].append([
+                            next(iter(cell.get("userEnteredValue", {"": ""}).values()))
+                            for cell in row.get("values", [])
+                        ])
+                    replies.append({})
+                else:
+                    replies.append({})
+            return httpx.Response(200, json={"replies": replies})
+
+        if tail == "values:batchGet":
+            value_ranges = []
+            for a1_range in request.url.params.get_list("ranges"):
+                title, cells = split_a1(a1_range)
+                if title not in book:
+                    return httpx.Response(400, json={"error": f"Unable to parse range: {a1_range}"})
+                value_ranges.append({"range": a1_range, "values": slice_a1(book[title], cells)})
+            return httpx.Response(200, json={"valueRanges": value_ranges})
+
+        if tail.startswith("values/"):
+            a1_range = tail[len("values/"):]
+            if request.method == "POST" and a1_range.endswith(":append"):
+                title, _ = split_a1(a1_range[:-len(":append")])
+                if title not in book:
+                    return httpx.Response(400, json={"error": f"Unable to parse range: {a1_range}"})
+                book[title].extend(body.get("values", []))
+                return httpx.Response(200, json={"updates": {"updatedRows": len(body.get("values", []))}})
+
+            title, cells = split_a1(a1_range)
+            if title not in book:
+                return httpx.Response(400, json={"error": f"Unable to parse range: {a1_range}"})
+            return httpx.Response(200, json={"range": a1_range, "values": slice_a1(book[title], cells)})
+
+        return httpx.Response(404, json={"error": f"not faked: {request.method} {path}"})
+
+
+class FakeAuth:
+    """Token provider that never talks to Google."""
+
+    async def headers(self) -> dict[str, str]:
+        return {"Authorization": "Bearer fake"}
+
+
+class _FakeCaches:
+
+    def __init__(self, min_chars: int):
+        self.min_chars = min_chars
+        self.store: dict[str, dict] = {}
+        self.calls: Counter = Counter()
+
+    async def create(self, *, model: str, config: CreateCachedContentConfig) -> CachedContent:
+        self.calls["create"] += 1
+        size = len(config.system_instruction or "") + sum(len(c) for c in config.contents or [])
+        if size < self.min_chars:
+            raise ClientError(400, {"error": {"code": 400, "message": "Cached content is too small", "status": "INVALID_ARGUMENT"}})
+        name = f"cachedContents/{self.calls['create']}"
+        self.store[name] = {"model": model, "system_instruction": config.system_instruction, "contents": list(config.contents)}
+        return CachedContent(name=name, model=model, display_name=config.display_name)
+
+    async def update(self, *, name: str, config: UpdateCachedContentConfig) -> CachedContent:
+        self.calls["update"] += 1
+        if name not in self.store:
+            raise ClientError(404, {"error": {"code": 404, "message": "CachedContent not found", "status": "NOT_FOUND"}})
+        return CachedContent(name=name)
+
+    async def delete(self, *, name: str) -> None:
+        self.calls["delete"] += 1
+        self.store.pop(name, None)
+
+
+class _FakeFiles:
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.store: dict[str, File] = {}
+        self.calls: Counter = Counter()
+
+    async def upload(self, *, file, config) -> File:
+        await asyncio.sleep(self.latency)
+        self.calls["upload"] += 1
+        name = f"files/{self.calls['upload']}"
+        self.store[name] = File(
+            name=name, display_name=config.display_name, mime_type=config.mime_type,
+            create_time=datetime.now(timezone.utc))
+        return self.store[name]
+
+    async def delete(self, *, name: str) -> None:
+        await asyncio.sleep(self.latency)
+        self.calls["delete"] += 1
+        if self.store.pop(name, None) is None:
+            raise ClientError(404, {"error": {"code": 404, "message": "File not found", "status": "NOT_FOUND"}})
+
+    async def list(self):
+        files = list(self.store.values())
+
+        async def pager():
+            for file in files:
+                yield file
+
+        return pager()
+
+
+class _FakeModels:
+
+    def __init__(self, caches: _FakeCaches, latency: float | Callable[[], float]):
+        self.caches = caches
+        self.latency = latency
+        self.stream_repeat = 5
+        self.requests: list[dict] = []
+        # raised by the next calls, one per call
+        self.errors: list[Exception] = []
+
+    def _wait(self):
+        return asyncio.sleep(self.latency() if callable(self.latency) else self.latency)
+
+    async def generate_content(self, *, model: str, contents, config: GenerateContentConfig | None = None):
+        await self._wait()
+        if self.errors:
+            raise self.errors.pop(0)
+        cached = config.cached_content if config else None
+        if cached and cached not in self.caches.store:
+            raise ClientError(404, {"error": {"code": 404, "message": "CachedContent not found", "status": "NOT_FOUND"}})
+        contents = list(contents) if isinstance(contents, list) else [contents]
+        self.requests.append({"model": model, "config": config, "contents": contents})
+        text = f"feedback #{len(self.requests)}"
+        schema = config.response_schema if config else None
+        if isinstance(schema, type):
+            parsed = schema.model_validate({field: f"{field} #{len(self.requests)}" for field in schema.model_fields})
+            return SimpleNamespace(text=parsed.model_dump_json(), parsed=parsed)
+        count = (config.candidate_count if config else None) or 1
+        candidates = [
+            SimpleNamespace(content=SimpleNamespace(parts=[SimpleNamespace(text=f"{text}.{i}" if count > 1 else text)]))
+            for i in range(count)
+        ]
+        return SimpleNamespace(text=candidates[0].content.parts[0].text, parsed=None, candidates=candidates)
+
+    async def generate_content_stream(self, *, model: str, contents, config: GenerateContentConfig | None = None):
+        response = await self.generate_content(model=model, contents=contents, config=config)
+        texts = [candidate.content.parts[0].text for candidate in response.candidates]
+        words = [(text + " ") * self.stream_repeat for text in texts]
+
+        async def chunks():
+            # the candidates advance together, one word each per chunk
+            for i, word in enumerate(words[0].split(" ")[:-1]):
+                await self._wait()
+                parts = [candidate.split(" ")[i] + " " for candidate in words]
+                yield SimpleNamespace(text=parts[0], candidates=[
+                    SimpleNamespace(index=index, content=SimpleNamespace(parts=[SimpleNamespace(text=part)]))
+                    for index, part in enumerate(parts)
+                ])
+
+        return chunks()
+
+
+class FakeGenAIClient:
+    """
+    Mimics the parts of google.genai.Client used by src/utils/genai.py.
+    Caches smaller than `min_cache_chars` are rejected like the real minimum token count.
+    `latency` of a model call may be a callable drawing a new value every time.
+    """
+
+    def __init__(self, *, min_cache_chars: int = 4096, latency: float | Callable[[], float] = 0.0):
+        caches = _FakeCaches(min_cache_chars)
+        files = _FakeFiles(0.0 if callable(latency) else latency)
+        self.aio = SimpleNamespace(caches=caches, files=files, models=_FakeModels(caches, latency))
+
+
+class FakeTelegramSession(BaseSession):
+    """
+    Bot API session for polling benchmarks. Every request costs `rtt`, half on
+    the way there and half on the way back. getUpdates returns up to `limit`
+    pushed updates after the offset, or waits for the next push like a long
+    poll. Other methods answer True.
+    """
+
+    def __init__(self, updates: list[dict] = (), *, rtt: float = 0.05, limit: int = 100):
+        super().__init__()
+        self.updates = list(updates)
+        self.rtt = rtt
+        self.limit = limit
+        self.calls: Counter = Counter()
+        self._pushed = asyncio.Event()
+
+    def push(self, update: dict) -> None:
+        self.updates.append(update)
+        self._pushed.set()
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int | None = None):
+        self.calls[type(method).__name__] += 1
+        await asyncio.sleep(self.rtt / 2)
+
+        if isinstance(method, GetMe):
+            result = User(id=bot.id, is_bot=True, first_name="Fake", username="fake_bot")
+        elif isinstance(method, GetUpdates):
+            offset = method.offset or 0
+            pending = lambda: [u for u in self.updates if u["update_id"] >= offset][:method.limit or self.limit]
+            if not pending():
+                self._pushed.clear()
+                try:
+                    await asyncio.wait_for(self._pushed.wait(), method.timeout or 0)
+                except asyncio.TimeoutError:
+                    pass
+            result = [Update.model_validate(u, context={"bot": bot}) for u in pending()]
+        else:
+            result = True
+
+        await asyncio.sleep(self.rtt / 2)
+        return result
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self) -> None:
+        pass
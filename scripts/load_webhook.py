@@ -0,0 +1,175 @@
+"""
+Local load test of the webhook runtime against long polling.
+
+Synthetic message updates reach "Telegram" at --rate per second (or in one
+burst) and are delivered both ways to a dispatcher whose only handler waits
+--work seconds, like a handler waiting on Redis or the Bot API. Polling
+reads them through getUpdates from FakeTelegramSession, at most 100 per
+round trip. The webhook gets them as HTTP POSTs to build_webhook_app on a
+local port, at most --connections at a time like Telegram's
+max_connections, each delayed by half the round trip. The numbers show how
+fast the transport takes updates in. The bot's own handlers are not part of
+the test.
+
+    python -m scripts.load_webhook --updates 2000 --rate 200 --rtt 0.05 --work 0.02
+    python -m scripts.load_webhook --updates 2000 --rtt 0.05
+"""
+import time
+import asyncio
+import argparse
+import statistics
+
+import aiohttp
+from aiohttp import web
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+
+from src.config import Config, Webhook
+from src.webhook import build_webhook_app
+
+from scripts.fakes import FakeTelegramSession
+
+TOKEN = "123456:FAKE"
+SECRET = "load-test-secret"
+
+
+def build_updates(count: int, users: int) -> list[dict]:
+    return [
+        {
+            "update_id": i + 1,
+            "message": {
+                "message_id": i + 1,
+                "date": 0,
+                "chat": {"id": 1000 + i % users, "type": "private"},
+                "from": {"id": 1000 + i % users, "is_bot": False, "first_name": "Load"},
+                "text": f"message {i}",
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def build_dispatcher(args: argparse.Namespace, arrivals: dict[int, float], latencies: list[float], done: asyncio.Event) -> Dispatcher:
+    router = Router()
+
+    @router.message()
+    async def handle(message: Message):
+        await asyncio.sleep(args.work)
+        latencies.append(time.perf_counter() - arrivals[message.message_id])
+        if len(latencies) == args.updates:
+            done.set()
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+async def arrive(args: argparse.Namespace, updates: list[dict], arrivals: dict[int, float], deliver) -> None:
+    """Hand the updates to Telegram at --rate per second (all at once if 0)."""
+
+    started = time.perf_counter()
+    tasks = []
+    for i, update in enumerate(updates):
+        if args.rate:
+            await asyncio.sleep(max(0.0, started + i / args.rate - time.perf_counter()))
+        arrivals[update["update_id"]] = time.perf_counter()
+        tasks.append(asyncio.create_task(deliver(update)))
+    await asyncio.gather(*tasks)
+
+
+async def run_polling(args: argparse.Namespace, updates: list[dict]) -> tuple[float, list[float]]:
+    arrivals, latencies, done = {}, [], asyncio.Event()
+    dp = build_dispatcher(args, arrivals, latencies, done)
+    session = FakeTelegramSession(rtt=args.rtt)
+    bot = Bot(TOKEN, session=session)
+
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False, polling_timeout=1))
+    # let the first long poll start
+    await asyncio.sleep(args.rtt * 2)
+
+    async def deliver(update: dict):
+        session.push(update)
+
+    started = time.perf_counter()
+    await arrive(args, updates, arrivals, deliver)
+    await done.wait()
+    elapsed = time.perf_counter() - started
+
+    await dp.stop_polling()
+    await polling
+    return elapsed, latencies
+
+
+async def run_webhook(args: argparse.Namespace, updates: list[dict]) -> tuple[float, list[float], dict]:
+    arrivals, latencies, done = {}, [], asyncio.Event()
+    dp = build_dispatcher(args, arrivals, latencies, done)
+    bot = Bot(TOKEN, session=FakeTelegramSession(rtt=args.rtt))
+    config = Config.model_construct(webhook=Webhook(
+        secret_token=SECRET, max_tasks=args.max_tasks, queue_timeout=args.queue_timeout))
+
+    app = build_webhook_app(bot, dp, config)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}{config.webhook.path}"
+
+    connections = asyncio.Semaphore(args.connections)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.connections)) as session:
+
+        async def deliver(update: dict):
+            # like Telegram: retried until accepted
+            while True:
+                async with connections:
+                    await asyncio.sleep(args.rtt / 2)
+                    async with session.post(url, json=update, headers=headers) as response:
+                        if response.status == 200:
+                            return
+                await asyncio.sleep(args.rtt)
+
+        async with session.post(url, json=updates[0], headers={}) as response:
+            assert response.status == 401, "a request without the secret token must be refused"
+
+        started = time.perf_counter()
+        await arrive(args, updates, arrivals, deliver)
+        await done.wait()
+        elapsed = time.perf_counter() - started
+
+    stats = dict(app["handler"].stats)
+    await runner.cleanup()
+    return elapsed, latencies, stats
+
+
+def report(name: str, elapsed: float, latencies: list[float]) -> None:
+    ordered = sorted(latencies)
+    print(f"{name:>8}: {len(ordered) / elapsed:7.0f} updates/s, "
+          f"p50 {statistics.median(ordered) * 1000:6.0f} ms, "
+          f"p99 {ordered[int(len(ordered) * 0.99) - 1] * 1000:6.0f} ms from arrival to handled")
+
+
+async def main(args: argparse.Namespace) -> None:
+    updates = build_updates(args.updates, args.users)
+
+    print(f"{args.updates} updates {f'at {args.rate:g}/s' if args.rate else 'at once'}, rtt {args.rtt * 1000:.0f} ms, work {args.work * 1000:.0f} ms, "
+          f"{args.connections} connections, {args.max_tasks} tasks")
+    report("polling", *await run_polling(args, updates))
+
+    elapsed, latencies, stats = await run_webhook(args, updates)
+    report("webhook", elapsed, latencies)
+    print(f"{'':>8}  {stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=0.0, help="updates per second, 0 for a single burst")
+    parser.add_argument("--rtt", type=float, default=0.05)
+    parser.add_argument("--work", type=float, default=0.02)
+    parser.add_argument("--connections", type=int, default=40)
+    parser.add_argument("--max-tasks", type=int, default=100)
+    parser.add_argument("--queue-timeout", type=float, default=10.0)
+    asyncio.run(main(parser.parse_args()))
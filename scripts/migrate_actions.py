@@ -0,0 +1,176 @@
+"""
+Move the legacy action lists (<user id>_a, JSON UserAction entries pushed with
+LPUSH) into the action streams used by src/utils/action_log.py.
+
+Each user's entries are merged with whatever the bot has already written to
+actions:<user id> since the switch, the stream is rebuilt under a temporary
+key and renamed over the live one in a transaction watched for concurrent
+writes. The global stream is rebuilt the same way at the end, and only then
+are the users recorded in the actions_migrated set, so an interrupted run can
+simply be repeated: entries already merged are recognised and skipped.
+Best run while the bot is stopped.
+
+    python -m scripts.migrate_actions --dry-run
+    python -m scripts.migrate_actions --delete-lists
+"""
+import json
+import asyncio
+import argparse
+import logging
+from datetime import datetime
+
+import pytz
+from redis.asyncio import Redis
+from redis.exceptions import WatchError
+
+from src.config import load_config
+from src.enums import RedisKeys
+from src.utils.action_log import user_stream
+
+DATE_FORMATS = ("%Y-%m-%d_%H-%M-%S", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%d.%m.%Y %H:%M:%S")
+RETRIES = 3
+
+logger = logging.getLogger(__name__)
+
+
+def parse_ms(date: str, formats: tuple[str, ...], tz) -> int | None:
+    for fmt in formats:
+        try:
+            moment = datetime.strptime(date, fmt)
+        except ValueError:
+            continue
+        return int(tz.localize(moment).timestamp() * 1000)
+    return None
+
+
+def assign_ids(entries: list[tuple[int, dict]]) -> list[tuple[str, dict]]:
+    """Stream ids for (ms, fields) pairs sorted by time, with a sequence number for equal milliseconds."""
+
+    result, last_ms, seq = [], -1, 0
+    for ms, fields in sorted(entries, key=lambda entry: entry[0]):
+        if ms <= last_ms:
+            ms, seq = last_ms, seq + 1
+        else:
+            seq = 0
+        # 0-0 is not a valid stream id
+        if ms == 0 and seq == 0:
+            seq = 1
+        last_ms = ms
+        result.append((f"{ms}-{seq}", fields))
+    return result
+
+
+def entry_ms(entry_id: str) -> int:
+    return int(entry_id.split("-")[0])
+
+
+async def read_legacy(redis: Redis, key: str, formats: tuple[str, ...], tz) -> tuple[list[tuple[int, str]], int]:
+    """(ms, action) pairs of a legacy list, oldest first, and the number of entries that could not be read."""
+
+    actions, skipped, last_ms = [], 0, 0
+    # LPUSH keeps the newest entry first
+    for raw in reversed(await redis.lrange(key, 0, -1)):
+        try:
+            item = json.loads(raw)
+            action = item["action_id"]
+        except (ValueError, KeyError, TypeError):
+            skipped += 1
+            continue
+
+        ms = parse_ms(item.get("date", ""), formats, tz)
+        if ms is None:
+            # no usable date: keep the list order by sticking to the previous entry
+            skipped += 1
+            ms = last_ms
+        actions.append((ms, action))
+        last_ms = ms
+    return actions, skipped
+
+
+async def rebuild(redis: Redis, key: str, legacy: list[tuple[int, dict]], maxlen: int, extra=None) -> int:
+    """Merge legacy entries into the stream at key. Returns the stream length."""
+
+    temp = f"{key}:migrating"
+    for _ in range(RETRIES):
+        async with redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                current = [(entry_ms(entry_id), fields) for entry_id, fields in await pipe.xrange(key)]
+                # entries a failed earlier run has already merged
+                seen = {(ms, tuple(sorted(fields.items()))) for ms, fields in current}
+                entries = current + [
+                    (ms, fields) for ms, fields in legacy
+                    if (ms, tuple(sorted(fields.items()))) not in seen]
+
+                pipe.multi()
+                pipe.delete(temp)
+                for entry_id, fields in assign_ids(entries):
+                    pipe.xadd(temp, fields, id=entry_id)
+                pipe.xtrim(temp, maxlen=maxlen, approximate=True)
+                if entries:
+                    pipe.rename(temp, key)
+                if extra is not None:
+                    extra(pipe)
+                await pipe.execute()
+                return len(entries)
+            except WatchError:
+                logger.warning(f"{key} changed during the migration, retrying")
+    raise RuntimeError(f"Could not migrate {key}: it keeps changing, stop the bot and run again")
+
+
+async def migrate(args) -> None:
+    config = load_config()
+    tz = pytz.timezone(config.system.time_zone)
+    formats = (args.date_format,) if args.date_format else DATE_FORMATS
+    redis = Redis.from_url(config.redis.users, decode_responses=True)
+
+    migrated = await redis.smembers(RedisKeys.ACTIONS_MIGRATED.value)
+    global_legacy: list[tuple[int, dict]] = []
+    done: dict[str, str] = {}
+    users = 0
+
+    try:
+        async for key in redis.scan_iter(match="*_a", count=500):
+            user_id = key[:-len("_a")]
+            if not user_id.isdigit() or user_id in migrated:
+                continue
+
+            actions, skipped = await read_legacy(redis, key, formats, tz)
+            users += 1
+            global_legacy.extend((ms, {"u": user_id, "a": action}) for ms, action in actions)
+            logger.info(f"{user_id}: {len(actions)} actions, {skipped} unreadable")
+            if args.dry_run:
+                continue
+
+            done[user_id] = key
+            await rebuild(
+                redis,
+                user_stream(user_id),
+                [(ms, {"a": action}) for ms, action in actions],
+                config.action_log.user_maxlen)
+
+        # users count as migrated only together with the global stream
+        def finish(pipe):
+            if done:
+                pipe.sadd(RedisKeys.ACTIONS_MIGRATED.value, *done)
+            if args.delete_lists and done:
+                pipe.delete(*done.values())
+
+        if not args.dry_run and done:
+            length = await rebuild(
+                redis, RedisKeys.ACTIONS.value, global_legacy, config.action_log.global_maxlen, finish)
+            logger.info(f"{RedisKeys.ACTIONS.value}: {length} actions")
+
+        logger.info(f"{users} users, {len(global_legacy)} legacy actions{' (dry run)' if args.dry_run else ''}")
+    finally:
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dry-run", action="store_true", help="only count what would be migrated")
+    parser.add_argument("--delete-lists", action="store_true", help="drop the legacy lists once migrated")
+    parser.add_argument("--date-format", help="strptime format of the legacy dates (several are tried by default)")
+    asyncio.run(migrate(parser.parse_args()))
@@ -0,0 +1,67 @@
+"""
+Move the legacy profile lists (key = user id, pretty-printed UserData JSON
+pushed with LPUSH) into the profile hashes and capped changelogs used by
+src/queries.py. The newest version becomes the hash, the newest
+profiles.history versions the changelog. Users that already have a hash are
+skipped, so the script can be run again.
+
+    python -m scripts.migrate_profiles --dry-run
+    python -m scripts.migrate_profiles --delete-lists
+"""
+import asyncio
+import argparse
+import logging
+
+from redis.asyncio import Redis
+
+from src.config import load_config
+from src.custom_types import UserData
+from src.utils.profiles import fingerprint, to_hash, profile_key, profile_log_key
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate(args) -> None:
+    config = load_config()
+    redis = Redis.from_url(config.redis.users, decode_responses=True)
+    users = skipped = 0
+
+    try:
+        async for key in redis.scan_iter(count=500, _type="list"):
+            if not key.isdigit() or await redis.exists(profile_key(key)):
+                continue
+
+            versions = []
+            for raw in await redis.lrange(key, 0, config.profiles.history - 1):
+                try:
+                    versions.append(UserData.model_validate_json(raw))
+                except Exception as e:
+                    logger.warning(f"{key}: unreadable version skipped: {e}")
+            if not versions:
+                skipped += 1
+                continue
+
+            users += 1
+            if args.dry_run:
+                continue
+
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.hset(profile_key(key), mapping={"fp": fingerprint(versions[0]), **to_hash(versions[0])})
+                # newest first, like the bot pushes them
+                pipe.rpush(profile_log_key(key), *(v.model_dump_json(exclude_none=True) for v in versions))
+                if args.delete_lists:
+                    pipe.delete(key)
+                await pipe.execute()
+
+        logger.info(f"{users} profiles migrated, {skipped} unreadable{' (dry run)' if args.dry_run else ''}")
+    finally:
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dry-run", action="store_true", help="only count what would be migrated")
+    parser.add_argument("--delete-lists", action="store_true", help="drop the legacy lists once migrated")
+    asyncio.run(migrate(parser.parse_args()))
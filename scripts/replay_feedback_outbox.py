@@ -0,0 +1,39 @@
+"""
+Move the feedback rows of the dead-letter stream (feedback_outbox_dead) back
+into the outbox, so the running drainer writes them to Sheets again. Fix the
+cause first (a missing tab, a revoked permission): rows that fail again are
+dead-lettered again.
+
+    python -m scripts.replay_feedback_outbox --dry-run
+    python -m scripts.replay_feedback_outbox --count 100
+"""
+import asyncio
+import argparse
+import logging
+
+from redis.asyncio import Redis
+
+from src.config import load_config
+from src.utils.feedback_outbox import replay_dead_letters
+
+logger = logging.getLogger(__name__)
+
+
+async def replay(args) -> None:
+    config = load_config()
+    redis = Redis.from_url(config.redis.temp, decode_responses=True)
+
+    try:
+        rows = await replay_dead_letters(redis, count=args.count, dry_run=args.dry_run)
+        logger.info(f"{rows} feedback rows {'found' if args.dry_run else 'queued again'}")
+    finally:
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--count", type=int, help="replay at most this many rows, oldest first")
+    parser.add_argument("--dry-run", action="store_true", help="only list the dead-lettered rows")
+    asyncio.run(replay(parser.parse_args()))
@@ -0,0 +1,197 @@
+import math
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+from aiogram import Bot
+from aiogram_dialog import DialogManager
+
+from .config import Config
+from .custom_types import CatalogSnapshot
+from .enums import DialogDataKeys
+from .google_queries import load_catalog, get_data_for_gemini
+from .utils.utils import get_middleware_data
+
+logger = logging.getLogger(__name__)
+
+
+class ContentCatalog:
+    """
+    Process-wide in-memory copy of the Sheets content: teachers, discipline
+    mapping, syllabi, tasks and prompts.
+
+    A snapshot younger than ``ttl`` is served as is. An older one is still
+    served for ``stale_ttl`` more seconds while one background task reloads
+    it. Past that, or after ``invalidate()``, the next caller waits for a
+    fresh load. Concurrent loads are collapsed into one: every caller awaits
+    the same in-flight load and gets its result or its exception. After a
+    failed load, a stale snapshot is served without reloading for
+    ``retry_backoff`` seconds; past the stale window every caller waits for a
+    load again. A load started before ``invalidate()`` is not joined.
+
+    The last ``history`` versions stay available through ``at()``, so dialogs
+    started on an older version keep seeing the content they started with.
+    """
+
+    def __init__(
+            self,
+            config: Config,
+            bot: Bot,
+            *,
+            ttl: float,
+            stale_ttl: float,
+            history: int,
+            retry_backoff: float):
+
+        self.config = config
+        self.bot = bot
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.history = history
+        self.retry_backoff = retry_backoff
+
+        self._snapshot: CatalogSnapshot | None = None
+        self._loaded_at: float = -math.inf
+        self._failed_at: float = -math.inf
+        self._load_task: asyncio.Task | None = None
+        self._load_generation = 0
+        self._generation = 0
+        self._refresh_task: asyncio.Task | None = None
+        self._history: OrderedDict[str, CatalogSnapshot] = OrderedDict()
+
+    @property
+    def snapshot(self) -> CatalogSnapshot | None:
+        return self._snapshot
+
+    def at(self, version: str | None) -> CatalogSnapshot | None:
+        """A recent snapshot by version, None if it is no longer kept."""
+        return self._history.get(version)
+
+    async def get(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        now = time.monotonic()
+        age = now - self._loaded_at
+
+        if snapshot is not None and age < self.ttl:
+            return snapshot
+
+        if snapshot is not None and age < self.ttl + self.stale_ttl:
+            if now - self._failed_at >= self.retry_backoff:
+                self._schedule_refresh()
+            return snapshot
+
+        try:
+            return await self.refresh()
+        except Exception as e:
+            if self._snapshot is None:
+                raise
+            logger.error(f"Catalog reload failed, serving version {self._snapshot.version}: {e}")
+            return self._snapshot
+
+    async def refresh(self) -> CatalogSnapshot:
+        """Load a new snapshot from Sheets; callers during a running load share its result or exception."""
+
+        if self._load_task is None or self._load_task.done() or self._load_generation != self._generation:
+            self._load_generation = self._generation
+            self._load_task = asyncio.create_task(self._load(self._generation))
+            self._load_task.add_done_callback(_retrieve_exception)
+
+        # a cancelled caller must not cancel the load the others are waiting for
+        return await asyncio.shield(self._load_task)
+
+    async def _load(self, generation: int) -> CatalogSnapshot:
+        try:
+            snapshot: CatalogSnapshot = await load_catalog(self.config, self.bot)
+        except Exception:
+            if generation == self._generation:
+                self._failed_at = time.monotonic()
+            raise
+
+        if generation != self._generation:
+            # started before an invalidate(): the load started after it decides
+            return snapshot
+
+        changed = self._snapshot is None or self._snapshot.version != snapshot.version
+
+        self._snapshot = snapshot
+        self._loaded_at = time.monotonic()
+        self._failed_at = -math.inf
+
+        self._history[snapshot.version] = snapshot
+        self._history.move_to_end(snapshot.version)
+        while len(self._history) > self.history:
+            self._history.popitem(last=False)
+
+        if changed:
+            logger.warning(f"Catalog loaded: version {snapshot.version}")
+
+        return snapshot
+
+    def invalidate(self) -> None:
+        """Force the next ``get()`` to wait for a fresh load."""
+        self._loaded_at = -math.inf
+        self._failed_at = -math.inf
+        self._generation += 1
+
+    def _schedule_refresh(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._background_refresh())
+
+    async def _background_refresh(self) -> None:
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f"Background catalog reload failed: {e}")
+
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    # the failure is reported to the callers; this only marks it as retrieved
+    # when all of them have gone away
+    if not task.cancelled():
+        task.exception()
+
+
+_catalog_instance: ContentCatalog | None = None
+
+
+def get_catalog(config: Config, bot: Bot) -> ContentCatalog:
+    """
+    Get or create the process-wide ContentCatalog.
+    """
+    global _catalog_instance
+    if _catalog_instance is None:
+        _catalog_instance = ContentCatalog(
+            config,
+            bot,
+            ttl=config.catalog.ttl,
+            stale_ttl=config.catalog.stale_ttl,
+            history=config.catalog.history,
+            retry_backoff=config.catalog.retry_backoff
+        )
+    return _catalog_instance
+
+
+async def get_dialog_catalog(dialog_manager: DialogManager) -> CatalogSnapshot:
+    """
+    The catalog version the feedback dialog was started on, or the current one
+    if that version is no longer kept (e.g. after a restart).
+    """
+
+    bot, config, _ = get_middleware_data(dialog_manager)
+    catalog: ContentCatalog = get_catalog(config, bot)
+
+    version = (dialog_manager.start_data or {}).get(DialogDataKeys.CATALOG_VERSION)
+    return catalog.at(version) or await catalog.get()
+
+
+async def get_gemini_data(dialog_manager: DialogManager) -> dict[str, str]:
+    """Data for a feedback request of the current dialog, resolved from the catalog."""
+
+    catalog: CatalogSnapshot = await get_dialog_catalog(dialog_manager)
+
+    return get_data_for_gemini(
+        catalog,
+        dialog_manager.dialog_data.get(DialogDataKeys.DISCIPLINE_ID, DialogDataKeys.UNKNOWN),
+        dialog_manager.dialog_data.get(DialogDataKeys.TASK_ID, DialogDataKeys.UNKNOWN),
+        dialog_manager.dialog_data.get(DialogDataKeys.FOR_GEMINI, {}))
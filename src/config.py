@@ -1,6 +1,6 @@
 import yaml
 from pydantic import \
-    BaseModel, PositiveInt, ValidationError, HttpUrl, Field
+    BaseModel, PositiveInt, PositiveFloat, ValidationError, HttpUrl, Field, model_validator
 
 
 class System(BaseModel):
@@ -47,6 +47,10 @@ class Redis(BaseModel):
     fsm: str
     users: str
     temp: str
+    max_connections: PositiveInt = Field(default=50, description="Connections per pool; one pool per db")
+    pool_timeout: PositiveFloat = Field(default=5.0, description="Seconds to wait for a free connection")
+    socket_timeout: PositiveFloat = Field(default=5.0, description="Seconds to wait for Redis to connect or answer")
+    health_check_interval: int = Field(default=30, ge=0, description="Seconds idle before a connection is pinged on reuse")
 
 
 class Google(BaseModel):
@@ -59,6 +63,9 @@ class Google(BaseModel):
     prompt_id: str
     prompt_tab: str
     service_account_json: str
+    read_requests_per_minute: PositiveInt = Field(default=60, description="Sheets read quota of the service account")
+    write_requests_per_minute: PositiveInt = Field(default=60, description="Sheets write quota of the service account")
+    max_in_flight: PositiveInt = Field(default=8, description="Concurrent Sheets requests across all spreadsheets")
 
 
 class LLM(BaseModel):
@@ -71,6 +78,117 @@ class LLM(BaseModel):
 class Telegraph(BaseModel):
     access_token: str
 
+
+class Catalog(BaseModel):
+
+    ttl: PositiveInt = Field(default=300, description="Seconds a loaded catalog is served as fresh")
+    stale_ttl: PositiveInt = Field(default=3600, description="Extra seconds a stale catalog is served while it reloads in the background")
+    history: PositiveInt = Field(default=4, description="Recent catalog versions kept for dialogs started on them")
+    retry_backoff: PositiveInt = Field(default=30, description="Seconds a stale catalog is served without reloading after a failed load")
+
+
+class FeedbackWriter(BaseModel):
+
+    flush_interval_ms: PositiveInt = Field(default=2000, description="How often buffered feedback rows are written to Sheets")
+    max_rows: PositiveInt = Field(default=50, description="Write right away once this many rows are buffered")
+    shutdown_timeout: PositiveFloat = Field(default=10.0, description="Seconds the final flush may take on shutdown")
+    outbox: bool = Field(default=True, description="Queue rows in a Redis Stream (temp db) drained by a background worker")
+    claim_idle_ms: PositiveInt = Field(default=60000, description="Pending outbox rows idle this long are retried")
+    max_deliveries: PositiveInt = Field(default=5, description="Outbox rows rejected by Sheets (4xx) this many times go to the dead-letter stream; transient errors are retried indefinitely")
+
+
+class ContextCache(BaseModel):
+
+    enabled: bool = Field(default=True, description="Send the system prompt and syllabus as Gemini cached content")
+    ttl: PositiveInt = Field(default=3600, description="Seconds a cached content lives")
+    refresh_margin: PositiveInt = Field(default=300, description="Extend a cache this many seconds before it expires")
+    negative_ttl: PositiveInt = Field(default=900, description="Seconds to send content inline after the API refused to cache it")
+
+
+class Streaming(BaseModel):
+
+    enabled: bool = Field(default=True, description="Stream feedback into the output message while it is generated")
+    edit_interval: PositiveFloat = Field(default=1.5, description="Minimum seconds between edits of the streamed message")
+
+
+class Audio(BaseModel):
+
+    inline_max_bytes: PositiveInt = Field(default=8 * 1024 * 1024, description="Voice notes up to this size are sent inline, larger ones via the Files API")
+    janitor_interval: PositiveInt = Field(default=3600, description="Seconds between sweeps for voice uploads left in the Files API")
+    orphan_age: PositiveInt = Field(default=3600, description="Uploads older than this many seconds are considered orphaned")
+    one_shot: bool = Field(default=False, description="Voice notes go straight into feedback generation, without reviewing the transcript")
+
+
+class ResponseCache(BaseModel):
+
+    enabled: bool = Field(default=True, description="Reuse model responses for identical requests (temp db)")
+    ttl: PositiveInt = Field(default=86400, description="Seconds a cached response lives")
+    max_entries: PositiveInt = Field(default=5000, description="Oldest responses are evicted above this many entries")
+    max_value_bytes: PositiveInt = Field(default=64 * 1024, description="Responses larger than this are not cached")
+
+
+class LLMScheduler(BaseModel):
+
+    max_concurrent: PositiveInt = Field(default=4, description="Model calls running at once")
+    max_queue: PositiveInt = Field(default=50, description="Model calls allowed to wait; more are refused")
+    max_per_user: PositiveInt = Field(default=2, description="Waiting model calls of a single user")
+
+
+class Hedging(BaseModel):
+
+    enabled: bool = Field(default=False, description="Send a second model request when the first one is slower than usual")
+    model: str | None = Field(default=None, description="Model for the second request, e.g. a faster one; the main model if empty")
+    percentile: PositiveFloat = Field(default=90, le=100, description="Latency percentile after which the second request is sent")
+    min_delay: PositiveFloat = Field(default=1.0, description="Never hedge earlier than this many seconds")
+    max_delay: PositiveFloat = Field(default=20.0, description="Never hedge later than this many seconds")
+    initial_delay: PositiveFloat = Field(default=8.0, description="Hedge delay until enough latencies are known")
+    window: PositiveInt = Field(default=200, description="Number of recent latencies the percentile is taken over")
+    min_samples: PositiveInt = Field(default=20, description="Latencies needed before the percentile is used")
+
+
+class Candidates(BaseModel):
+
+    count: PositiveInt = Field(default=1, le=8, description="Feedbacks requested per model call, streamed or not; the extra ones are kept for regeneration")
+    prefetch: bool = Field(default=False, description="Generate the next feedback in the background once one is shown")
+    ttl: PositiveInt = Field(default=3600, description="Seconds unused feedbacks are kept")
+
+
+class ActionLog(BaseModel):
+
+    user_maxlen: PositiveInt = Field(default=10_000, description="Approximate number of actions kept per user")
+    global_maxlen: PositiveInt = Field(default=1_000_000, description="Approximate number of actions kept in the global stream")
+
+
+class Profiles(BaseModel):
+
+    history: PositiveInt = Field(default=20, description="Previous profile versions kept per user")
+    recent: PositiveInt = Field(default=10_000, description="Users whose unchanged profile is recognised without Redis")
+
+
+class Webhook(BaseModel):
+
+    enabled: bool = Field(default=False, description="Receive updates on a webhook instead of long polling")
+    url: str | None = Field(default=None, description="Public HTTPS URL Telegram posts updates to, path included")
+    path: str = Field(default="/webhook", description="Path the local server takes updates on")
+    ready_path: str = Field(default="/ready", description="Readiness endpoint of the local server")
+    host: str = Field(default="0.0.0.0")
+    port: PositiveInt = Field(default=8080)
+    secret_token: str | None = Field(default=None, pattern=r"^[A-Za-z0-9_-]{1,256}$", description="Expected in X-Telegram-Bot-Api-Secret-Token, required when the webhook is enabled")
+    max_tasks: PositiveInt = Field(default=100, description="Updates processed at once; the rest wait for a slot")
+    queue_timeout: PositiveFloat = Field(default=10.0, description="Seconds an update waits for a slot before Telegram is told to retry")
+    max_connections: PositiveInt = Field(default=40, le=100, description="Concurrent connections Telegram may open to the webhook")
+    shutdown_timeout: PositiveFloat = Field(default=10.0, description="Seconds to let running updates finish on shutdown")
+
+    @model_validator(mode="after")
+    def check_url(self) -> "Webhook":
+        if self.enabled and not self.url:
+            raise ValueError("webhook.url is required when the webhook is enabled")
+        if self.enabled and not self.secret_token:
+            # without it anyone who learns the URL can post forged updates
+            raise ValueError("webhook.secret_token is required when the webhook is enabled")
+        return self
+
+
 class Config(BaseModel):
 
     system: System
@@ -85,6 +203,18 @@ class Config(BaseModel):
     openai: LLM
     gemini: LLM
     telegraph: Telegraph
+    catalog: Catalog = Field(default_factory=Catalog)
+    feedback_writer: FeedbackWriter = Field(default_factory=FeedbackWriter)
+    context_cache: ContextCache = Field(default_factory=ContextCache)
+    streaming: Streaming = Field(default_factory=Streaming)
+    audio: Audio = Field(default_factory=Audio)
+    response_cache: ResponseCache = Field(default_factory=ResponseCache)
+    llm_scheduler: LLMScheduler = Field(default_factory=LLMScheduler)
+    hedging: Hedging = Field(default_factory=Hedging)
+    candidates: Candidates = Field(default_factory=Candidates)
+    action_log: ActionLog = Field(default_factory=ActionLog)
+    profiles: Profiles = Field(default_factory=Profiles)
+    webhook: Webhook = Field(default_factory=Webhook)
 
 # Load the YAML configuration file
 def load_config() -> Config:
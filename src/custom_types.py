@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import ClassVar
 from pydantic import BaseModel, field_validator, ValidationInfo
 from pydantic import PositiveInt, Field
 
@@ -12,6 +13,23 @@ class Teacher(BaseModel):
     disciplines: list[str]
 
 
+class CatalogSnapshot(BaseModel):
+
+    version: str = Field(description="Content hash of the snapshot")
+    teachers: dict[int, Teacher] = Field(description="Teacher id -> teacher")
+    disciplines: dict[str, str] = Field(description="Discipline name -> discipline id (tab title)")
+    syllabus: dict[str, str] = Field(description="Discipline name -> syllabus text")
+    tasks: dict[str, list[list[str]]] = Field(description="Discipline id -> rows of (task name, task id, description)")
+    temperature: str
+    prompt: str
+
+
+class VoiceFeedback(BaseModel):
+
+    transcript: str = Field(description="Verbatim transcript of the teacher's voice note")
+    feedback: str = Field(description="Feedback for the student based on the voice note")
+
+
 class UserNotify(BaseModel):
 
     id: PositiveInt
@@ -25,6 +43,14 @@ class UserAction(BaseModel):
     action_id: str
 
 
+class ActionEvent(BaseModel):
+
+    id: str = Field(description="Stream entry id, <ms timestamp>-<seq>")
+    user_id: int
+    action: str
+    date: datetime
+
+
 class MessageForGPT(BaseModel):
 
     date: str = Field(default_factory=get_datetime_now)
@@ -85,9 +111,11 @@ class UserData(BaseModel):
         else:
             return v
 
+    COMPARED_FIELDS: ClassVar[tuple[str, ...]] = ("full_name", "username", "is_premium", "language_code")
+
     def compare_fields(self) -> tuple:
         
-        return (self.full_name, self.username, self.is_premium, self.language_code)
+        return tuple(getattr(self, field) for field in self.COMPARED_FIELDS)
     
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, UserData):
@@ -11,7 +11,9 @@ from aiogram_dialog.widgets.text import Format, Const
 from aiogram_dialog.widgets.input import TextInput, MessageInput
 
 from ..enums import DialogDataKeys
-from ..google_queries import put_feedback
+from ..custom_types import CatalogSnapshot
+from ..catalog import get_dialog_catalog
+from ..google_queries import put_feedback, get_discipline_name, get_task
 from ..utils.utils import get_middleware_data
 
 from ..utils.feedback_handlers import \
@@ -29,7 +31,8 @@ async def on_dialog_start(
         start_data: Any,
         dialog_manager: DialogManager):
 
-    dialog_manager.dialog_data[DialogDataKeys.FOR_GEMINI] = start_data[DialogDataKeys.FOR_GEMINI]
+    # only the teacher's input lives here; content comes from the catalog
+    dialog_manager.dialog_data[DialogDataKeys.FOR_GEMINI] = {}
 
 
 async def dialog_get_data(
@@ -43,29 +46,9 @@ async def dialog_get_data(
     discipline_name = dialog_manager.dialog_data.get(
         DialogDataKeys.DISCIPLINE_NAME, DialogDataKeys.UNKNOWN)
 
-    discipline_id = dialog_manager.dialog_data.get(
-        DialogDataKeys.DISCIPLINE_ID, DialogDataKeys.UNKNOWN)
-
     task_name = dialog_manager.dialog_data.get(
         DialogDataKeys.TASK_NAME, DialogDataKeys.UNKNOWN)
 
-    task_id = dialog_manager.dialog_data.get(
-        DialogDataKeys.TASK_ID, DialogDataKeys.UNKNOWN)
-
-    task_description = dialog_manager.start_data.get(discipline_id, {}).get(task_id, {}).get(
-        DialogDataKeys.TASK_DESCRIPTION, DialogDataKeys.UNKNOWN)
-
-    syllabus = dialog_manager.start_data.get(discipline_id, {}).get(
-        DialogDataKeys.SYLLABUS, DialogDataKeys.UNKNOWN)
-
-    
-    dialog_manager.dialog_data[DialogDataKeys.FOR_GEMINI].update({
-        DialogDataKeys.DISCIPLINE_NAME: discipline_name,
-        DialogDataKeys.TASK_NAME: task_name,
-        DialogDataKeys.TASK_DESCRIPTION: task_description,
-        DialogDataKeys.SYLLABUS: syllabus
-    })
-
 
     data = {
         "back_btn": i18n.service.back_btn(),
@@ -88,7 +71,12 @@ async def get_disciplines(
         dialog_manager: DialogManager,
         **kwargs):
 
-    disciplines = [(v.get("name", "None"), k) for k, v in dialog_manager.start_data.items() if k != DialogDataKeys.FOR_GEMINI]
+    catalog: CatalogSnapshot = await get_dialog_catalog(dialog_manager)
+
+    disciplines = [
+        (get_discipline_name(catalog, discipline_id), discipline_id)
+        for discipline_id in dialog_manager.start_data.get(DialogDataKeys.DISCIPLINES, [])
+        ]
 
     return {"disciplines": sorted(disciplines, key=lambda x: x[0])}
 
@@ -101,9 +89,9 @@ async def get_tasks(
     current_discipline = dialog_manager.dialog_data.get(
         DialogDataKeys.DISCIPLINE_ID, DialogDataKeys.UNKNOWN)
 
-    tasks = [
-        (v.get("name", "None"), k) for k, v in dialog_manager.start_data.get(current_discipline, {}).items() if "task" in k
-        ]
+    catalog: CatalogSnapshot = await get_dialog_catalog(dialog_manager)
+
+    tasks = [(task_name, index) for task_name, index, _ in catalog.tasks.get(current_discipline, [])]
 
     return {"tasks": tasks}
 
@@ -114,8 +102,9 @@ async def discipline_selection(
         dialog_manager: DialogManager, 
         item_id: str):
     
-    # Get discipline name from start_data
-    discipline_name = dialog_manager.start_data.get(item_id, {}).get("name", DialogDataKeys.UNKNOWN)
+    # Get discipline name from the catalog
+    catalog: CatalogSnapshot = await get_dialog_catalog(dialog_manager)
+    discipline_name = get_discipline_name(catalog, item_id)
     
     dialog_manager.dialog_data[DialogDataKeys.DISCIPLINE_ID] = item_id
     dialog_manager.dialog_data[DialogDataKeys.DISCIPLINE_NAME] = discipline_name
@@ -129,11 +118,12 @@ async def task_selection(
         dialog_manager: DialogManager, 
         item_id: str):
 
-    # Get task name from start_data
+    # Get task name from the catalog
     discipline_id = dialog_manager.dialog_data.get(
         DialogDataKeys.DISCIPLINE_ID, DialogDataKeys.UNKNOWN)
 
-    task_name = dialog_manager.start_data.get(discipline_id, {}).get(item_id, {}).get("name", DialogDataKeys.UNKNOWN)
+    catalog: CatalogSnapshot = await get_dialog_catalog(dialog_manager)
+    task_name, _ = get_task(catalog, discipline_id, item_id)
     
     dialog_manager.dialog_data[DialogDataKeys.TASK_ID] = item_id
     dialog_manager.dialog_data[DialogDataKeys.TASK_NAME] = task_name
@@ -145,7 +135,12 @@ async def get_data_for_output(
         dialog_manager: DialogManager,
         **kwargs):
 
-    return {"feedback_text": dialog_manager.dialog_data.get(DialogDataKeys.FOR_GEMINI, {}).get(DialogDataKeys.FEEDBACK_TEXT, DialogDataKeys.UNKNOWN)}
+    for_gemini: dict = dialog_manager.dialog_data.get(DialogDataKeys.FOR_GEMINI, {})
+
+    return {
+        "feedback_text": for_gemini.get(DialogDataKeys.FEEDBACK_TEXT, DialogDataKeys.UNKNOWN),
+        "feedback_ready": not for_gemini.get(DialogDataKeys.FEEDBACK_STREAMING, False)
+        }
 
 
 async def new_feedback(callback: CallbackQuery, button: Button, dialog_manager: DialogManager):
@@ -248,9 +243,10 @@ dialog = Dialog(
         Row(
             Button(Const("👎"), id="dislike_id", on_click=handle_feedback),
             Button(Const("👍"), id="like_id", on_click=handle_feedback),
+            when=F["feedback_ready"]
         ),
-        Button(Const("🔄 Перегенерировать"), id="redo_btn_id", on_click=redo_feedback),
-        Button(Const("🚀 Начать новый фидбек"), id="new_feedback_btn_id", on_click=new_feedback),
+        Button(Const("🔄 Перегенерировать"), id="redo_btn_id", on_click=redo_feedback, when=F["feedback_ready"]),
+        Button(Const("🚀 Начать новый фидбек"), id="new_feedback_btn_id", on_click=new_feedback, when=F["feedback_ready"]),
         getter=get_data_for_output,
         state=Feedback.OUTPUT
     ),
@@ -34,6 +34,15 @@ class RedisKeys(str, Enum):
     KNOWN_USERS = "known_users"
     PARSER_JOBS = "parser_jobs"
     PARSER_JOBS_RUNNING = "parser_jobs_running"
+    FEEDBACK_OUTBOX = "feedback_outbox"
+    FEEDBACK_OUTBOX_DEAD = "feedback_outbox_dead"
+    LLM_CACHE = "llm_cache"
+    LLM_CACHE_INDEX = "llm_cache_index"
+    FEEDBACK_CANDIDATES = "feedback_candidates"
+    ACTIONS = "actions"
+    ACTIONS_MIGRATED = "actions_migrated"
+    PROFILE = "profile"
+    PROFILE_LOG = "profile_log"
 
 
 class DialogDataKeys(str, Enum):
@@ -51,3 +60,6 @@ class DialogDataKeys(str, Enum):
     TEXT_FROM_TEACHER = "text_from_teacher"
     TRANSCRIPTION_FROM_AUDIO = "transcription_from_audio"
     FEEDBACK_TEXT = "feedback_text"
+    FEEDBACK_STREAMING = "feedback_streaming"
+    CATALOG_VERSION = "catalog_version"
+    DISCIPLINES = "disciplines"
@@ -1,25 +1,39 @@
+import json
+import hashlib
 import logging
+from datetime import datetime
+
+import pytz
 
 logger = logging.getLogger(__name__)
 
 from aiogram_dialog import DialogManager
 from aiogram import Bot
+from aiogram.fsm.storage.redis import RedisStorage
 
-from .utils.sheets_async import SheetsAsync
+from .utils.sheets_async import SheetsAsync, get_shared_auth, close_shared_resources
+from .utils.fetch_plan import SheetsFetchPlan, FetchResult
+from .utils.feedback_writer import FeedbackWriter, feedback_row
+from .utils.feedback_outbox import FeedbackOutbox, enqueue_feedback
+from .utils.redis_registry import get_redis
 
 from .config import Config
-from .utils.utils import get_middleware_data
-from .custom_types import Teacher
+from .utils.utils import get_request_context
+from .utils.request_context import RequestContext
+from .custom_types import Teacher, CatalogSnapshot
+
+from .enums import DialogDataKeys, Database
 
-from .enums import DialogDataKeys
 
-from my_tools import get_datetime_now, DateTimeKeys
+DEMO_DISCIPLINE: tuple[str, str] = ("Демо: Финмоделирование", "demo")
 
 
 # Multiple singletons for different spreadsheets
 _teachers_sheets_instance: SheetsAsync | None = None
 _content_sheets_instance: SheetsAsync | None = None
 _prompts_sheets_instance: SheetsAsync | None = None
+_feedback_writer_instance: FeedbackWriter | None = None
+_feedback_outbox_instance: FeedbackOutbox | None = None
 
 
 def get_teachers_sheets_instance(config: Config) -> SheetsAsync:
@@ -30,7 +44,10 @@ def get_teachers_sheets_instance(config: Config) -> SheetsAsync:
     if _teachers_sheets_instance is None:
         _teachers_sheets_instance = SheetsAsync(
             spreadsheet_id = config.google.feedbacks_and_accesses_id,
-            sa_json_path = config.google.service_account_json
+            sa_json_path = config.google.service_account_json,
+            read_per_minute = config.google.read_requests_per_minute,
+            write_per_minute = config.google.write_requests_per_minute,
+            max_in_flight = config.google.max_in_flight
         )
     return _teachers_sheets_instance
 
@@ -44,7 +61,10 @@ def get_content_sheets_instance(config: Config) -> SheetsAsync:
     if _content_sheets_instance is None:
         _content_sheets_instance = SheetsAsync(
             spreadsheet_id = config.google.content_id,  # Different spreadsheet
-            sa_json_path = config.google.service_account_json
+            sa_json_path = config.google.service_account_json,
+            read_per_minute = config.google.read_requests_per_minute,
+            write_per_minute = config.google.write_requests_per_minute,
+            max_in_flight = config.google.max_in_flight
         )
     return _content_sheets_instance
 
@@ -57,27 +77,101 @@ def get_prompts_sheets_instance(config: Config) -> SheetsAsync:
     if _prompts_sheets_instance is None:
         _prompts_sheets_instance = SheetsAsync(
             spreadsheet_id = config.google.prompt_id,
-            sa_json_path = config.google.service_account_json
+            sa_json_path = config.google.service_account_json,
+            read_per_minute = config.google.read_requests_per_minute,
+            write_per_minute = config.google.write_requests_per_minute,
+            max_in_flight = config.google.max_in_flight
         )
     return _prompts_sheets_instance
 
 
-# Teachers spreadsheet operations
-async def get_teachers(config: Config, bot: Bot) -> list[Teacher]:
+async def open_sheets(config: Config) -> None:
+    """
+    Create the Sheets instances, their shared HTTP/2 client and the service
+    account credentials before the first update arrives.
+    """
+    get_teachers_sheets_instance(config)
+    get_content_sheets_instance(config)
+    get_prompts_sheets_instance(config)
+
+    try:
+        await get_shared_auth(config.google.service_account_json).headers()
+    except Exception as e:
+        logger.error(f"Could not fetch a Google token on startup, will retry on first request: {e}")
+
+
+async def close_sheets() -> None:
+    """
+    Close the shared Sheets client; call after the feedback sinks are closed.
+    """
+    await close_shared_resources()
+
+
+def get_feedback_writer(config: Config) -> FeedbackWriter:
+    """
+    Get or create a singleton write-behind FeedbackWriter for the teachers spreadsheet.
+    """
+    global _feedback_writer_instance
+    if _feedback_writer_instance is None:
+        _feedback_writer_instance = FeedbackWriter(
+            get_teachers_sheets_instance(config),
+            flush_interval = config.feedback_writer.flush_interval_ms / 1000,
+            max_rows = config.feedback_writer.max_rows,
+            shutdown_timeout = config.feedback_writer.shutdown_timeout
+        )
+    return _feedback_writer_instance
+
+
+def get_feedback_outbox(config: Config) -> FeedbackOutbox:
+    """
+    Get or create a singleton drainer of the feedback Redis Stream.
+    """
+    global _feedback_outbox_instance
+    if _feedback_outbox_instance is None:
+        _feedback_outbox_instance = FeedbackOutbox(
+            get_redis(config, Database.TEMP, decode_responses=True),
+            get_teachers_sheets_instance(config),
+            flush_interval = config.feedback_writer.flush_interval_ms / 1000,
+            max_rows = config.feedback_writer.max_rows,
+            claim_idle_ms = config.feedback_writer.claim_idle_ms,
+            max_deliveries = config.feedback_writer.max_deliveries,
+            shutdown_timeout = config.feedback_writer.shutdown_timeout
+        )
+    return _feedback_outbox_instance
+
+
+def start_feedback_sinks(config: Config) -> None:
+    """
+    Start draining the feedback outbox, including rows left over from a previous run.
     """
-    Get list of teachers from Google Sheets.
+    if config.feedback_writer.outbox:
+        get_feedback_outbox(config).start()
+
+
+async def close_feedback_sinks() -> None:
+    """
+    Flush buffered feedback and stop the outbox drainer (each bounded by its shutdown timeout).
     """
-    sheet: SheetsAsync = get_teachers_sheets_instance(config)
+    if _feedback_writer_instance is not None:
+        await _feedback_writer_instance.close()
 
-    read_res = await sheet.read(f"{config.google.accesses_tab}!A1:C")
+    if _feedback_outbox_instance is not None:
+        await _feedback_outbox_instance.close()
 
+
+# Teachers spreadsheet operations
+async def parse_teachers(config: Config, bot: Bot | None, rows: list[list[str]]) -> list[Teacher]:
+    """
+    Parse teachers from the accesses tab rows (header included).
+    """
     teachers: list[Teacher] = []
-    for row in read_res.get("values")[1:]:
+    for row in rows[1:]:
         if len(row) > 2:
             try:
                 teachers.append(Teacher(id=row[1], name=row[0], disciplines=row[2].split(", ")))
             except Exception as e:
-                await bot.send_message(config.owner.id, f"❗Error parsing teacher:\n <code>{e}\n{row}</code>")
+                if bot is not None:
+                    await bot.send_message(config.owner.id, f"❗Error parsing teacher:\n <code>{e}\n{row}</code>")
                 logger.error(f"Error parsing teacher: {e}")
 
     return teachers
@@ -93,128 +187,138 @@ async def get_teachers(config: Config, bot: Bot) -> list[Teacher]:
 #     return set([teacher.id for teacher in teachers])
 
 
-async def get_list_of_disciplines(
-        config: Config, 
-        teachers: list[Teacher],
-        user_id: int) -> list[tuple[str, str]]:
+async def load_catalog(config: Config, bot: Bot | None) -> CatalogSnapshot:
     """
-    Get list of disciplines for a current teacher.
+    Read everything the feedback dialog needs from Google Sheets into one snapshot.
+
+    All ranges go through one SheetsFetchPlan: a single batchGet per spreadsheet,
+    with the three spreadsheets read concurrently.
     """
+    teachers_sheet: SheetsAsync = get_teachers_sheets_instance(config)
+    content_sheet: SheetsAsync = get_content_sheets_instance(config)
+    prompts_sheet: SheetsAsync = get_prompts_sheets_instance(config)
+
+    accesses_range = f"{config.google.accesses_tab}!A1:C"
+    disciplines_range = f"{config.google.accesses_tab}!E1:F"
+    syllabus_range = f"{config.google.syllabus_tab}!A2:C"
+    prompts_range = f"{config.google.prompt_tab}!K2:K"
+
+    plan = SheetsFetchPlan()
+    plan.add(teachers_sheet, accesses_range)
+    plan.add(teachers_sheet, disciplines_range)
+    plan.add(content_sheet, syllabus_range)
+    plan.add_every_tab(content_sheet, "A2:C", exclude=(config.google.syllabus_tab, config.google.content_tab))
+    plan.add(prompts_sheet, prompts_range)
+
+    result: FetchResult = await plan.execute()
+
+    teachers: list[Teacher] = await parse_teachers(config, bot, result.values(teachers_sheet, accesses_range))
+    discipline_ids: dict[str, str] = dict(
+        [(el[0], el[1]) for el in result.values(teachers_sheet, disciplines_range)[1:]]) # {"Матметоды": "mathmethods", ...}
+    syllabus: list[list[str]] = result.values(content_sheet, syllabus_range)
+    task_tabs: dict[str, list[list[str]]] = result.tabs(content_sheet)
+    prompts: list[list[str]] = result.values(prompts_sheet, prompts_range)
+
+    disciplines: list[tuple[str, str]] = list(discipline_ids.items()) + [DEMO_DISCIPLINE]
+
+    content = {
+        "teachers": {},
+        "disciplines": discipline_ids,
+        "syllabus": {},
+        "tasks": {discipline_id: task_tabs.get(discipline_id, []) for _, discipline_id in disciplines},
+        "temperature": prompts[2][0],
+        "prompt": prompts[-1][0]
+    }
 
-    teachers_ids: set[int] = set([teacher.id for teacher in teachers])
-    if user_id in teachers_ids:
+    for teacher in teachers:
+        content["teachers"].setdefault(teacher.id, teacher)
 
-        sheet: SheetsAsync = get_teachers_sheets_instance(config)
+    for row in syllabus:
+        if len(row) > 2:
+            content["syllabus"].setdefault(row[0], row[2])
 
-        read_discs = await sheet.read(f"{config.google.accesses_tab}!E1:F")
+    digest = hashlib.sha1(
+        json.dumps(content, sort_keys=True, ensure_ascii=False, default=lambda t: t.model_dump()).encode()
+        ).hexdigest()
 
-        discs = dict([(el[0], el[1]) for el in read_discs.get("values")[1:]])
+    return CatalogSnapshot(version=digest[:12], **content)
 
-        teacher = next((t for t in teachers if t.id == user_id), None)
 
-        return [(d, discs.get(d)) for d in teacher.disciplines] # [("Матметоды", "mathmethods"), ...]
+def get_data_for_dialog(
+        catalog: CatalogSnapshot,
+        user_id: int) -> dict[str, str | list[str]]:
+    """
+    start_data of the feedback dialog: only the catalog version and the ids of
+    the teacher's disciplines (the demo one for strangers). The content itself
+    is looked up in the in-process catalog when needed.
+    """
 
+    teacher: Teacher | None = catalog.teachers.get(user_id)
+    if teacher is not None:
+        discipline_ids = [catalog.disciplines[d] for d in teacher.disciplines if d in catalog.disciplines]
     else:
-        return [("Демо: Финмоделирование", "demo")]
+        discipline_ids = [DEMO_DISCIPLINE[1]]
 
-
-async def get_list_of_tasks(
-        config: Config,
-        disciplines: list[tuple[str, str]]) -> list[tuple[str, str]]:
-
-    sheet: SheetsAsync = get_content_sheets_instance(config)
-
-    task_data: dict[str, list[list[str]]] = {}
-
-    spreadsheet_meta = await sheet.get_spreadsheet()
-    existing_tabs = {
-        sheet_info["properties"]["title"]
-        for sheet_info in spreadsheet_meta.get("sheets", [])
+    return {
+        DialogDataKeys.CATALOG_VERSION: catalog.version,
+        DialogDataKeys.DISCIPLINES: discipline_ids
     }
 
-    ranges_to_fetch: list[str] = []
-    for _, discipline_id in disciplines:
-        if discipline_id not in existing_tabs:
-            task_data[discipline_id] = []
-            continue
-
-        ranges_to_fetch.append(f"{discipline_id}!A2:C")
-        task_data.setdefault(discipline_id, [])
-
-    if ranges_to_fetch:
-        batch_result = await sheet.batch_get(ranges_to_fetch)
-        for value_range in batch_result.get("valueRanges", []):
-            range_name = value_range.get("range", "")
-            sheet_title = range_name.split("!", 1)[0].strip("'") if range_name else ""
-            if sheet_title in task_data:
-                task_data[sheet_title] = value_range.get("values", [])
 
-    return task_data
+def get_discipline_name(catalog: CatalogSnapshot, discipline_id: str) -> str:
 
+    if discipline_id == DEMO_DISCIPLINE[1]:
+        return DEMO_DISCIPLINE[0]
 
-async def get_syllabus(
-        config: Config,
-        disciplines: list[tuple[str, str]]) -> list[tuple[str, str, str]]:
-    
-    sheet: SheetsAsync = get_content_sheets_instance(config)
-    read_syllabases = await sheet.read(f"{config.google.syllabus_tab}!A2:C")
-    
-    return read_syllabases.get("values")
+    for name, id_ in catalog.disciplines.items():
+        if id_ == discipline_id:
+            return name
 
+    return DialogDataKeys.UNKNOWN
 
-async def get_prompts(
-        config: Config) -> list[tuple[str, str]]:
-    
-    sheet: SheetsAsync = get_prompts_sheets_instance(config)
-    read_prompts = await sheet.read(f"{config.google.prompt_tab}!K2:K")
 
-    return read_prompts.get("values")
+def get_task(catalog: CatalogSnapshot, discipline_id: str, task_id: str) -> tuple[str, str]:
+    """(name, description) of a task."""
 
+    for task_name, index, task_description in catalog.tasks.get(discipline_id, []):
+        if index == task_id:
+            return task_name, task_description
 
-async def get_data_for_dialog(
-        config: Config,
-        teachers: list[Teacher],
-        user_id: int) -> dict[str, dict[str, dict[str, str]]]:
+    return DialogDataKeys.UNKNOWN, DialogDataKeys.UNKNOWN
 
-    dialog_data: dict = {}
 
-    disciplines: list[tuple[str, str]] = await get_list_of_disciplines(config, teachers, user_id)
-    syllabus: list[tuple[str, str, str]] = await get_syllabus(config, disciplines)
-    tasks: list[tuple[str, str, str]] = await get_list_of_tasks(config, disciplines)
-    prompts: list[tuple[str, str]] = await get_prompts(config)
+def get_data_for_gemini(
+        catalog: CatalogSnapshot,
+        discipline_id: str,
+        task_id: str,
+        for_gemini: dict) -> dict[str, str]:
+    """Everything a feedback request needs: catalog content plus the teacher's input from dialog_data."""
 
-    for discipline_name, discipline_id in disciplines:
-        dialog_data[discipline_id] = {
-            "name": discipline_name,
-            "syllabus": [el[2] for el in syllabus if el[0] == discipline_name][0]
-            }
+    discipline_name = get_discipline_name(catalog, discipline_id)
+    task_name, task_description = get_task(catalog, discipline_id, task_id)
 
-        for task_name, index, task_description in tasks[discipline_id]:
-            dialog_data[discipline_id][index] = {
-                "name": task_name,
-                "description": task_description}
-
-    dialog_data[DialogDataKeys.FOR_GEMINI] = {
-        DialogDataKeys.TEMPERATURE: prompts[2][0],
-        DialogDataKeys.PROMPT: prompts[-1][0]
+    return {
+        **for_gemini,
+        DialogDataKeys.TEMPERATURE: catalog.temperature,
+        DialogDataKeys.PROMPT: catalog.prompt,
+        DialogDataKeys.DISCIPLINE_NAME: discipline_name,
+        DialogDataKeys.TASK_NAME: task_name,
+        DialogDataKeys.TASK_DESCRIPTION: task_description,
+        DialogDataKeys.SYLLABUS: catalog.syllabus.get(discipline_name, DialogDataKeys.UNKNOWN)
     }
 
-    return dialog_data
-
-
 
 async def put_feedback(
         dialog_manager: DialogManager,
         like: bool):
 
-    _, config, user_data = get_middleware_data(dialog_manager)
-    
-    sheet: SheetsAsync = get_teachers_sheets_instance(config)
+    context: RequestContext = get_request_context(dialog_manager)
+    config, user_data = context.config, context.user_data
 
-    discipline_name = dialog_manager.dialog_data.get(DialogDataKeys.FOR_GEMINI, {}).get(
+    discipline_name = dialog_manager.dialog_data.get(
         DialogDataKeys.DISCIPLINE_NAME, DialogDataKeys.UNKNOWN)
 
-    task_name = dialog_manager.dialog_data.get(DialogDataKeys.FOR_GEMINI, {}).get(
+    task_name = dialog_manager.dialog_data.get(
         DialogDataKeys.TASK_NAME, DialogDataKeys.UNKNOWN)
 
     text_from_teacher = dialog_manager.dialog_data.get(DialogDataKeys.FOR_GEMINI, {}).get(
@@ -223,9 +327,17 @@ async def put_feedback(
     feedback = dialog_manager.dialog_data.get(DialogDataKeys.FOR_GEMINI, {}).get(
         DialogDataKeys.FEEDBACK_TEXT, DialogDataKeys.UNKNOWN)
 
-    await sheet.append(
-        f"{user_data.id}!A1:F",
-        [
-            [discipline_name, task_name, text_from_teacher, feedback, int(like), get_datetime_now(DateTimeKeys.DEFAULT)]
-        ]
-    )
+    row = feedback_row(
+        discipline_name, task_name, text_from_teacher, feedback, like,
+        datetime.now(pytz.timezone(config.system.time_zone)))
+
+    # Written to Sheets in the background, the button press does not wait for Sheets
+    if config.feedback_writer.outbox:
+        temp_storage: RedisStorage = context.temp
+        try:
+            await enqueue_feedback(temp_storage.redis, str(user_data.id), row)
+            return
+        except Exception as e:
+            logger.error(f"Error queueing feedback for {user_data.id} ({user_data.full_name}), buffering in memory: {e}")
+
+    get_feedback_writer(config).add(str(user_data.id), row)
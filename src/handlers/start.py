@@ -3,20 +3,23 @@ import asyncio
 
 from aiogram import Router, F
 from aiogram.types import Message, ErrorEvent, InlineKeyboardButton, InlineKeyboardMarkup
-from aiogram.filters import ExceptionTypeFilter, CommandStart
-from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.filters import ExceptionTypeFilter, CommandStart, Command
+from aiogram.dispatcher.event.bases import SkipHandler
 
 from aiogram_dialog import DialogManager, StartMode, ShowMode
 from aiogram_dialog.api.exceptions import UnknownIntent, UnknownState
 
 from my_tools import DialogManagerKeys
 
-from ..custom_types import Teacher
+from ..custom_types import CatalogSnapshot
 from ..states import Feedback
 from ..enums import Database, Action
-from ..utils.utils import get_middleware_data, send_typing_action
+from ..utils.utils import get_middleware_data, get_request_context, send_typing_action
+from ..utils.request_context import RequestContext
+from ..utils.redis_registry import get_redis_registry
 from ..queries import add_action
-from ..google_queries import get_teachers, get_data_for_dialog
+from ..google_queries import get_data_for_dialog
+from ..catalog import get_catalog, ContentCatalog
 from ..config import Config
 
 from fluentogram import TranslatorHub
@@ -43,8 +46,6 @@ async def process_start(message: Message, dialog_manager: DialogManager) -> None
     log_message = f"Bot is starting for {user_data.id} ({user_data.full_name})"
     logging.warning(log_message)
 
-    teachers: list[Teacher] = await get_teachers(config, bot)
-
     await add_action(dialog_manager, Action.START)
 
     current_state = get_current_state(dialog_manager, config, user_data.id)
@@ -52,7 +53,8 @@ async def process_start(message: Message, dialog_manager: DialogManager) -> None
     typing_task = asyncio.create_task(send_typing_action(user_data.id, bot))
 
     try:
-        start_data: dict = await get_data_for_dialog(config, teachers, user_data.id)
+        catalog: CatalogSnapshot = await get_catalog(config, bot).get()
+        start_data: dict = get_data_for_dialog(catalog, user_data.id)
         await start_dialog(dialog_manager, current_state, start_data)
         
     except Exception as e:
@@ -70,8 +72,28 @@ async def process_start(message: Message, dialog_manager: DialogManager) -> None
 
     finally:
         typing_task.cancel()
-    
-    
+
+
+@router.message(Command("reload"))
+async def process_reload(message: Message, dialog_manager: DialogManager) -> None:
+    """Reload the content catalog from Google Sheets right away (admins only)."""
+
+    bot, config, user_data = get_middleware_data(dialog_manager)
+
+    if user_data.id not in set(config.admins.ids + config.superadmins.ids):
+        raise SkipHandler()
+
+    catalog: ContentCatalog = get_catalog(config, bot)
+    catalog.invalidate()
+
+    try:
+        snapshot: CatalogSnapshot = await catalog.refresh()
+        await message.answer(f"🔄 Каталог обновлён, версия <code>{snapshot.version}</code>")
+    except Exception as e:
+        logging.error(f"Error reloading catalog for {user_data.id} ({user_data.full_name}): {e}")
+        await message.answer(f"❗Не удалось обновить каталог:\n<code>{e}</code>")
+
+
 @router.errors(ExceptionTypeFilter(UnknownIntent))
 async def on_unknown_intent(event: ErrorEvent, dialog_manager: DialogManager):
     """Handle UnknownIntent Error and start a new dialog."""
@@ -87,23 +109,30 @@ async def on_unknown_state(event: ErrorEvent, dialog_manager: DialogManager):
 async def handle_error_and_restart(event: ErrorEvent, dialog_manager: DialogManager, error_type: str):
     """Common logic for handling errors and restarting the dialog."""
 
-    _, config, user_data = get_middleware_data(dialog_manager)
+    bot, config, user_data = get_middleware_data(dialog_manager)
 
     logging.error(f"{error_type} Error for {user_data.id} ({user_data.full_name}). Restarting dialog: %s", event.exception)
 
-    # Update middleware data with Redis storage instances
-    dialog_manager.middleware_data[Database.USERS.value] = RedisStorage.from_url(url=config.redis.users)
-    dialog_manager.middleware_data[Database.TEMP.value] = RedisStorage.from_url(url=config.redis.temp)
+    # Update middleware data with the shared Redis storages
+    registry = get_redis_registry(config)
+    dialog_manager.middleware_data[Database.USERS.value] = registry.storage(Database.USERS)
+    dialog_manager.middleware_data[Database.TEMP.value] = registry.storage(Database.TEMP)
 
     # Set up the translator for the user's language
     hub: TranslatorHub = dialog_manager.middleware_data.get(DialogManagerKeys.TRANSLATOR_HUB)
     dialog_manager.middleware_data['i18n'] = hub.get_translator_by_locale(locale=user_data.language_code)
 
+    context: RequestContext = get_request_context(dialog_manager)
+    context.users = dialog_manager.middleware_data[Database.USERS.value]
+    context.temp = dialog_manager.middleware_data[Database.TEMP.value]
+    context.i18n = dialog_manager.middleware_data['i18n']
+
     # Restart the dialog
     await add_action(dialog_manager, Action.RESTART)
     current_state = get_current_state(dialog_manager, config, user_data.id)
-    
-    await start_dialog(dialog_manager, current_state)
+
+    catalog: CatalogSnapshot = await get_catalog(config, bot).get()
+    await start_dialog(dialog_manager, current_state, get_data_for_dialog(catalog, user_data.id))
 
 
 async def start_dialog(
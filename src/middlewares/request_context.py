@@ -0,0 +1,22 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from src.utils.request_context import RequestContext, REQUEST_CONTEXT
+
+
+class RequestContextMiddleware(BaseMiddleware):
+    """Must come after the storage and translator middlewares it reads from."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+
+        if data.get('event_from_user') is not None:
+            data[REQUEST_CONTEXT] = RequestContext.from_data(data)
+
+        return await handler(event, data)
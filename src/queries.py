@@ -1,93 +1,137 @@
 import logging
 
+from redis.asyncio import Redis
+from redis.commands.core import AsyncScript
 from aiogram_dialog import DialogManager
 from aiogram.fsm.storage.redis import RedisStorage
 
-from .enums import Database, Action, RedisKeys
-from .custom_types import UserAction, UserData
+from .enums import Action, RedisKeys
+from .custom_types import UserData
+from .config import Config
 
-from .utils.utils import get_middleware_data
+from .utils.utils import get_request_context
+from .utils.request_context import RequestContext
+from .utils.action_log import user_stream
+from .utils.profiles import RecentProfiles, fingerprint, to_hash, profile_key, profile_log_key
 
 
-async def add_action(
-        dialog_manager: DialogManager,
-        action: str,
-        user_data: UserData | None = None
-) -> None:
+# One round trip for an action: both stream entries and, on /start and restart,
+# the profile upsert. The profile hash is rewritten, and the version added to the
+# capped changelog, only if the fingerprint of the compared fields differs from
+# the stored one; returns 1 if it was.
+#   KEYS: user stream, global stream, known users, profile hash, profile changelog
+#   ARGV: user id, action, user maxlen, global maxlen, fingerprint ("" to skip the
+#         profile), changelog size, version json, then profile hash field/value pairs
+RECORD_ACTION = """
+redis.call("XADD", KEYS[1], "MAXLEN", "~", ARGV[3], "*", "a", ARGV[2])
+redis.call("XADD", KEYS[2], "MAXLEN", "~", ARGV[4], "*", "u", ARGV[1], "a", ARGV[2])
 
-    if not user_data:
-        _, _, user_data = get_middleware_data(dialog_manager)
+if ARGV[5] == "" then
+    return 0
+end
 
-    users_storage: RedisStorage = dialog_manager.middleware_data.get(Database.USERS)
-    
-    await push_action(action, user_data, users_storage)
+redis.call("SADD", KEYS[3], ARGV[1])
 
-    if action.startswith(tuple([Action.START, Action.RESTART])):
+if redis.call("HGET", KEYS[4], "fp") == ARGV[5] then
+    return 0
+end
 
-        await users_storage.redis.sadd(RedisKeys.KNOWN_USERS, user_data.id)
+redis.call("DEL", KEYS[4])
+redis.call("HSET", KEYS[4], "fp", ARGV[5], unpack(ARGV, 8))
+redis.call("LPUSH", KEYS[5], ARGV[7])
+redis.call("LTRIM", KEYS[5], 0, tonumber(ARGV[6]) - 1)
+return 1
+"""
 
-        current_profile: UserData | None = await get_current_profile(users_storage, user_data)
-        user_data_json = user_data.model_dump_json(indent=4)
+_record_action_script: AsyncScript | None = None
+_recent_profiles: RecentProfiles | None = None
 
-        if current_profile is None or current_profile != user_data:
-            try:
-                await users_storage.redis.lpush(user_data.id, user_data_json)
-            except Exception as e:
-                logging.error(f"Error updating profile for user {user_data.id} ({user_data.full_name}):\n{e}")
 
+def get_recent_profiles(config: Config) -> RecentProfiles:
 
-async def push_action(
-        action: str, 
-        user_data: UserData, 
-        users_storage: RedisStorage
-        ) -> None:
-    
-    """
-    Pushes a user action to the Redis list.
-    
-    Args:
-        action (str): The action identifier.
-        user_data (UserData): The user's data.
-        users_storage (RedisStorage): The Redis storage interface.
-    """
+    global _recent_profiles
+    if _recent_profiles is None:
+        _recent_profiles = RecentProfiles(config.profiles.recent)
+    return _recent_profiles
 
-    user_action: UserAction = UserAction(action_id=action)
-    user_action_json = user_action.model_dump_json(indent=4)
 
-    try:
-        await users_storage.redis.lpush(f"{user_data.id}_a", user_action_json)
+async def add_action(
+        dialog_manager: DialogManager,
+        action: str,
+        user_data: UserData | None = None
+) -> None:
+
+    context: RequestContext = get_request_context(dialog_manager)
+    config = context.config
+    if not user_data:
+        user_data = context.user_data
+
+    users_storage: RedisStorage = context.users
 
+    try:
+        await record_action(users_storage.redis, config, action, user_data)
     except Exception as e:
-        logging.error(f"Error pushing action for user {user_data.id} ({user_data.full_name})):\n{e}")
+        logging.error(f"Error recording action for user {user_data.id} ({user_data.full_name}):\n{e}")
+
 
+async def record_action(
+        redis: Redis,
+        config: Config,
+        action: str,
+        user_data: UserData
+        ) -> bool:
 
-async def get_current_profile(
-    users_storage: RedisStorage,
-    user_data: UserData
-    ) -> UserData | None:
     """
-    Retrieves and validates the current profile for a user from Redis.
+    Appends a user action to the user's and the global action streams and, for
+    /start and restart, registers the user and updates the profile, all in one
+    Redis round trip. Profiles this process has already seen unchanged are
+    not sent at all.
     
     Args:
-        users_storage (RedisStorage): The Redis storage interface.
+        redis (Redis): Client of the users database.
+        config (Config): Bot config with the stream caps.
+        action (str): The action identifier.
         user_data (UserData): The user's data.
-    
+
     Returns:
-        UserData | None: The validated user profile or None if not found or invalid.
+        bool: Whether a new profile version was stored.
     """
 
-    current_profile_raw = await users_storage.redis.lindex(user_data.id, 0)
-
-    if not current_profile_raw:
-        return None
-    
-    try:
-        current_profile: UserData = UserData.model_validate_json(current_profile_raw)
-    
-    except Exception as e:
-        logging.warning(f"Validation error for user {user_data.id}:\n{e}")
-        logging.warning(f"Can't validate raw json\n{current_profile_raw}")
-
-        current_profile = None
-
-    return current_profile
\ No newline at end of file
+    global _record_action_script
+    if _record_action_script is None:
+        _record_action_script = redis.register_script(RECORD_ACTION)
+
+    recent = get_recent_profiles(config)
+    fp = ""
+    profile = []
+    if action.startswith((Action.START, Action.RESTART)):
+        fp = fingerprint(user_data)
+        if recent.seen(user_data.id, fp):
+            # stored or checked by this process already
+            fp = ""
+        else:
+            profile = [user_data.model_dump_json(exclude_none=True)]
+            for name, value in to_hash(user_data).items():
+                profile += [name, value]
+
+    changed = await _record_action_script(
+        keys=[
+            user_stream(user_data.id),
+            RedisKeys.ACTIONS.value,
+            RedisKeys.KNOWN_USERS.value,
+            profile_key(user_data.id),
+            profile_log_key(user_data.id)],
+        args=[
+            user_data.id,
+            action,
+            config.action_log.user_maxlen,
+            config.action_log.global_maxlen,
+            fp,
+            config.profiles.history,
+            *profile],
+        client=redis)
+
+    if fp:
+        recent.remember(user_data.id, fp)
+
+    return bool(changed)
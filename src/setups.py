@@ -11,9 +11,11 @@ from src.handlers.start import router as start_router
 from src.dialogs.feedback import dialog as feedback_dialog
 
 from src.config import Config
+from src.utils.redis_registry import RedisRegistry, get_redis_registry
 
 from src.middlewares.redis_storage import RedisStorageMiddleware
 from src.middlewares.i18n import TranslatorRunnerMiddleware
+from src.middlewares.request_context import RequestContextMiddleware
 
 from src.enums import Database
 
@@ -37,28 +39,33 @@ async def setup_bot(config: Config) -> Bot:
         BotCommand(command='/start', description='🚀 Start')
         ]
     await bot.set_my_commands(main_menu_commands)
-    await bot.delete_webhook(drop_pending_updates=True)
+    if config.webhook.enabled:
+        await bot.set_webhook(
+            url=config.webhook.url,
+            secret_token=config.webhook.secret_token,
+            max_connections=config.webhook.max_connections,
+            drop_pending_updates=True)
+    else:
+        await bot.delete_webhook(drop_pending_updates=True)
 
     return bot
 
 
 async def setup_dispathcer(config: Config) -> Dispatcher:
 
-    fsm: RedisStorage = RedisStorage.from_url(
-        url=config.redis.fsm, 
-        connection_kwargs={"client_name": Database.FSM.value},
+    registry: RedisRegistry = get_redis_registry(config)
+    await registry.ping()
+
+    fsm: RedisStorage = registry.storage(
+        Database.FSM,
         key_builder=DefaultKeyBuilder(
             with_bot_id=True,
             with_destiny=True
             ))
     
-    users: RedisStorage = RedisStorage.from_url(
-        url=config.redis.users, 
-        connection_kwargs={"client_name": Database.USERS.value})
+    users: RedisStorage = registry.storage(Database.USERS)
     
-    temp: RedisStorage = RedisStorage.from_url(
-        url=config.redis.temp, 
-        connection_kwargs={"client_name": Database.TEMP.value})
+    temp: RedisStorage = registry.storage(Database.TEMP)
     
     dp: Dispatcher = Dispatcher(storage=fsm)
     
@@ -67,6 +74,7 @@ async def setup_dispathcer(config: Config) -> Dispatcher:
     dp.update.middleware.register(RedisStorageMiddleware(storage=temp, db_name=Database.TEMP))
 
     dp.update.middleware(TranslatorRunnerMiddleware())
+    dp.update.middleware(RequestContextMiddleware())
 
     dp.include_router(router)
 
@@ -0,0 +1,73 @@
+import logging
+from datetime import datetime, timezone
+
+from redis.asyncio import Redis
+
+from ..custom_types import ActionEvent
+from ..enums import RedisKeys
+
+logger = logging.getLogger(__name__)
+
+
+def user_stream(user_id: int | str) -> str:
+    return f"{RedisKeys.ACTIONS.value}:{user_id}"
+
+
+def stream_id(moment: datetime) -> str:
+    """Smallest stream id at or after this moment (naive datetimes are taken as UTC)."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return str(int(moment.timestamp() * 1000))
+
+
+def _text(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class ActionStreamReader:
+    """
+    User actions in Redis Streams: one stream per user (actions:<user id>,
+    field ``a``) and a global one (actions, fields ``u`` and ``a``). The time
+    of an action is its stream id, so entries carry nothing else. They are
+    written by record_action (src/queries.py), in the same script call that
+    caps both streams with an approximate MAXLEN.
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+
+    async def read(
+            self,
+            user_id: int | None = None,
+            start: datetime | None = None,
+            end: datetime | None = None,
+            count: int | None = None,
+            latest: bool = False) -> list[ActionEvent]:
+        """
+        Actions of one user, or of everyone if ``user_id`` is None, between
+        ``start`` and ``end`` inclusive, oldest first. With ``latest`` the
+        ``count`` newest ones are returned instead of the oldest.
+        """
+
+        key = user_stream(user_id) if user_id is not None else RedisKeys.ACTIONS.value
+        low = stream_id(start) if start is not None else "-"
+        # the whole last millisecond of the range
+        high = f"{stream_id(end)}-18446744073709551615" if end is not None else "+"
+
+        if latest:
+            entries = list(reversed(await self.redis.xrevrange(key, max=high, min=low, count=count)))
+        else:
+            entries = await self.redis.xrange(key, min=low, max=high, count=count)
+
+        return [self._event(entry_id, fields, user_id) for entry_id, fields in entries]
+
+    @staticmethod
+    def _event(entry_id, fields: dict, user_id: int | None) -> ActionEvent:
+        fields = {_text(k): _text(v) for k, v in fields.items()}
+        entry_id = _text(entry_id)
+
+        return ActionEvent(
+            id=entry_id,
+            user_id=user_id if user_id is not None else int(fields["u"]),
+            action=fields["a"],
+            date=datetime.fromtimestamp(int(entry_id.split("-")[0]) / 1000, tz=timezone.utc))
@@ -0,0 +1,75 @@
+import logging
+
+from redis.asyncio import Redis
+
+from ..config import Config
+from ..enums import RedisKeys, Database
+from .redis_registry import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class CandidateBuffer:
+    """
+    Spare feedbacks waiting for the regenerate button, one Redis list per
+    dialog and teacher input: feedback_candidates:<dialog id>:<input hash>.
+    A new input gets a new, empty list; old ones expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, redis: Redis, *, ttl: int):
+        self.redis = redis
+        self.ttl = ttl
+        self.prefix = RedisKeys.FEEDBACK_CANDIDATES.value
+
+    def _key(self, dialog_id: str, input_key: str) -> str:
+        return f"{self.prefix}:{dialog_id}:{input_key}"
+
+    async def push(self, dialog_id: str, input_key: str, texts: list[str]) -> None:
+        texts = [text for text in texts if text]
+        if not texts:
+            return
+
+        key = self._key(dialog_id, input_key)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.rpush(key, *texts)
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not buffer {len(texts)} feedback candidates: {e}")
+
+    async def pop(self, dialog_id: str, input_key: str) -> str | None:
+        try:
+            return await self.redis.lpop(self._key(dialog_id, input_key))
+        except Exception as e:
+            logger.warning(f"Could not read buffered feedback candidates: {e}")
+            return None
+
+    async def size(self, dialog_id: str, input_key: str) -> int:
+        try:
+            return await self.redis.llen(self._key(dialog_id, input_key))
+        except Exception as e:
+            logger.warning(f"Could not read buffered feedback candidates: {e}")
+            return 0
+
+
+_candidate_buffer_instance: CandidateBuffer | None = None
+
+
+def get_candidate_buffer(config: Config) -> CandidateBuffer:
+    """
+    Get or create a singleton CandidateBuffer in the temp db.
+    """
+    global _candidate_buffer_instance
+    if _candidate_buffer_instance is None:
+        _candidate_buffer_instance = CandidateBuffer(
+            get_redis(config, Database.TEMP, decode_responses=True),
+            ttl=config.candidates.ttl
+        )
+    return _candidate_buffer_instance
+
+
+async def close_candidate_buffer() -> None:
+    global _candidate_buffer_instance
+    # its client belongs to the Redis registry
+    _candidate_buffer_instance = None
@@ -1,22 +1,60 @@
 import asyncio
 import io
+import time
 import logging
+from contextlib import asynccontextmanager
 
 from aiogram.types import Message, CallbackQuery
+from aiogram.exceptions import TelegramRetryAfter
 from aiogram_dialog.widgets.kbd import Button
 
-from aiogram_dialog import DialogManager
+from aiogram_dialog import DialogManager, ShowMode
 from aiogram_dialog.widgets.input import MessageInput, ManagedTextInput
 
 from .utils import get_middleware_data, send_typing_action
-from .genai import generate_transcript
-from .genai import generate_feedback
+from .genai import generate_transcript, generate_voice_feedback
+from .genai import generate_feedback_candidates, stream_feedback_candidates, feedback_request_key, get_llm_scheduler
+from .llm_scheduler import QueueFull, FRESH, REDO, BACKGROUND
+from .candidates import get_candidate_buffer
 
+from ..config import Config
+from ..catalog import get_gemini_data
 from ..enums import DialogDataKeys
+from ..states import Feedback
 from ..google_queries import put_feedback
 
 MAX_BYTES = 10 * 1024 * 1024
 
+BUSY_MESSAGE = "⚠️ Сейчас слишком много запросов. Попробуйте ещё раз через минуту."
+
+
+@asynccontextmanager
+async def llm_slot(dialog_manager: DialogManager, priority: int = FRESH):
+    """
+    Wait for a turn in the LLM scheduler, telling the user their place in line
+    meanwhile, and show typing while the model call runs. Raises QueueFull.
+    """
+
+    bot, config, user_data = get_middleware_data(dialog_manager)
+    notice: Message | None = None
+
+    async def on_queued(position: int):
+        nonlocal notice
+        notice = await bot.send_message(user_data.id, f"⏳ Вы в очереди: {position}. Фидбек начнёт готовиться автоматически.")
+
+    async with get_llm_scheduler(config).slot(user_data.id, priority, on_queued):
+        if notice is not None:
+            try:
+                await notice.delete()
+            except Exception as e:
+                logging.warning(f"Could not delete the queue notice for {user_data.id}: {e}")
+
+        typing_task = asyncio.create_task(send_typing_action(user_data.id, bot))
+        try:
+            yield
+        finally:
+            typing_task.cancel()
+
 
 async def handle_voice(message: Message, widget: MessageInput, dialog_manager: DialogManager):
 
@@ -29,19 +67,24 @@ async def handle_voice(message: Message, widget: MessageInput, dialog_manager: D
     if message.voice:
         if message.voice.file_size <= MAX_BYTES:
 
-            typing_task = asyncio.create_task(send_typing_action(user_data.id, bot))
-
             try:
                 voice_file = io.BytesIO()
                 await bot.download(message.voice.file_id, destination=voice_file)
-                text = await generate_transcript(config, voice_file)
-                dialog_manager.dialog_data[DialogDataKeys.FOR_GEMINI][DialogDataKeys.TRANSCRIPTION_FROM_AUDIO] = text
 
+                async with llm_slot(dialog_manager):
+                    if config.audio.one_shot:
+                        await process_voice(dialog_manager, voice_file, message.voice.file_unique_id)
+                        return
+
+                    text = await generate_transcript(config, voice_file, message.voice.file_unique_id)
+                    dialog_manager.dialog_data[DialogDataKeys.FOR_GEMINI][DialogDataKeys.TRANSCRIPTION_FROM_AUDIO] = text
+
+            except QueueFull as e:
+                logging.warning(f"LLM queue full for {user_data.id} ({user_data.full_name}): {e}")
+                await message.answer(BUSY_MESSAGE)
             except Exception as e:
                 logging.error(f"Error generating transcript for {user_data.id} ({user_data.full_name}): {e}")
                 # await bot.send_message(user_data.id, f"❌ Ошибка при генерации транскрипта: {e}")
-            finally:
-                typing_task.cancel()
 
         else:
             await message.answer("⚠️ Голосовое слишком большое (>10 МБ). Отправьте более короткую запись.")
@@ -80,22 +123,197 @@ async def redo_feedback(
     dialog_manager: DialogManager):
 
     await put_feedback(dialog_manager, False)
-    await process_text(dialog_manager, default_config=True) # don't change the config
 
+    bot, config, user_data = get_middleware_data(dialog_manager)
+    for_gemini: dict = dialog_manager.dialog_data[DialogDataKeys.FOR_GEMINI]
 
-async def process_text(dialog_manager: DialogManager, default_config: bool = True):
+    if config.candidates.count > 1 or config.candidates.prefetch:
+        data: dict = await get_gemini_data(dialog_manager)
+        key = (dialog_manager.current_context().id, feedback_request_key(config, data))
+        buffer = get_candidate_buffer(config)
+
+        text = await buffer.pop(*key)
+        while text is None and key in _prefetch_tasks:
+            # spares are being generated already: wait for them instead of asking again
+            typing_task = asyncio.create_task(send_typing_action(user_data.id, bot))
+            try:
+                await asyncio.shield(_prefetch_tasks[key])
+            finally:
+                typing_task.cancel()
+            text = await buffer.pop(*key)
+
+        if text is not None:
+            for_gemini[DialogDataKeys.FEEDBACK_TEXT] = text
+            schedule_prefetch(dialog_manager, data)
+            return
+
+    await process_text(dialog_manager, default_config=True, use_cache=False, priority=REDO) # don't change the config
+
+
+async def process_text(
+        dialog_manager: DialogManager,
+        default_config: bool = True,
+        use_cache: bool = True,
+        priority: int = FRESH):
 
     bot, config, user_data = get_middleware_data(dialog_manager)
-    typing_task = asyncio.create_task(send_typing_action(user_data.id, bot))
 
     try:
-        feedback: str = await generate_feedback(config, dialog_manager.dialog_data[DialogDataKeys.FOR_GEMINI], default_config)
+        async with llm_slot(dialog_manager, priority):
+            if config.streaming.enabled:
+                await stream_text(dialog_manager, default_config, use_cache)
+            else:
+                await generate_text(dialog_manager, default_config, use_cache)
+
+    except QueueFull as e:
+        logging.warning(f"LLM queue full for {user_data.id} ({user_data.full_name}): {e}")
+        await bot.send_message(user_data.id, BUSY_MESSAGE)
+
+
+async def generate_text(dialog_manager: DialogManager, default_config: bool = True, use_cache: bool = True):
 
-        dialog_manager.dialog_data[DialogDataKeys.FOR_GEMINI][DialogDataKeys.FEEDBACK_TEXT] = feedback
+    _, config, user_data = get_middleware_data(dialog_manager)
 
-        await dialog_manager.next()
+    for_gemini: dict = dialog_manager.dialog_data[DialogDataKeys.FOR_GEMINI]
+
+    try:
+        data: dict = await get_gemini_data(dialog_manager)
+        feedback, *spare = await generate_feedback_candidates(
+            config, data, config.candidates.count, default_config, use_cache)
+
+        for_gemini[DialogDataKeys.FEEDBACK_TEXT] = feedback
+
+        await dialog_manager.switch_to(Feedback.OUTPUT)
+
+        if spare:
+            await get_candidate_buffer(config).push(
+                dialog_manager.current_context().id, feedback_request_key(config, data), spare)
+        schedule_prefetch(dialog_manager, data)
     except Exception as e:
         logging.error(f"Error generating feedback for {user_data.id} ({user_data.full_name}): {e}")
         # await bot.send_message(user_data.id, f"❌ Ошибка при генерации фидбека: {e}")
+
+
+async def process_voice(dialog_manager: DialogManager, voice_file: io.BytesIO, file_unique_id: str):
+    """
+    One request for both the transcript and the feedback. The transcript becomes
+    the teacher's text, so redo regenerates from it like from a typed input.
+    """
+
+    _, config, _ = get_middleware_data(dialog_manager)
+    for_gemini: dict = dialog_manager.dialog_data[DialogDataKeys.FOR_GEMINI]
+
+    data: dict = await get_gemini_data(dialog_manager)
+    result = await generate_voice_feedback(config, data, voice_file, file_unique_id)
+
+    for_gemini[DialogDataKeys.TRANSCRIPTION_FROM_AUDIO] = result.transcript
+    for_gemini[DialogDataKeys.TEXT_FROM_TEACHER] = result.transcript
+    for_gemini[DialogDataKeys.FEEDBACK_TEXT] = result.feedback
+
+    await dialog_manager.switch_to(Feedback.OUTPUT)
+
+
+async def stream_text(dialog_manager: DialogManager, default_config: bool = True, use_cache: bool = True):
+    """
+    Show the OUTPUT window right away and edit it with the text generated so far,
+    at most once per config.streaming.edit_interval seconds. The other
+    config.candidates.count - 1 feedbacks come in the same stream and are kept
+    for the regenerate button.
+    """
+
+    _, config, user_data = get_middleware_data(dialog_manager)
+    for_gemini: dict = dialog_manager.dialog_data[DialogDataKeys.FOR_GEMINI]
+
+    for_gemini[DialogDataKeys.FEEDBACK_TEXT] = "⏳"
+    for_gemini[DialogDataKeys.FEEDBACK_STREAMING] = True
+
+    try:
+        await dialog_manager.switch_to(Feedback.OUTPUT)
+        await dialog_manager.show()
+        # later renders edit the message that has just been sent
+        dialog_manager.show_mode = ShowMode.EDIT
+
+        data: dict = await get_gemini_data(dialog_manager)
+
+        texts = []
+        next_edit = time.monotonic() + config.streaming.edit_interval
+        async for texts in stream_feedback_candidates(config, data, config.candidates.count, default_config, use_cache):
+            for_gemini[DialogDataKeys.FEEDBACK_TEXT] = texts[0]
+
+            if time.monotonic() >= next_edit:
+                try:
+                    await dialog_manager.show()
+                    next_edit = time.monotonic() + config.streaming.edit_interval
+                except TelegramRetryAfter as e:
+                    next_edit = time.monotonic() + e.retry_after
+
+        if not texts or not texts[0]:
+            # nothing came back, e.g. a blocked response: don't offer the placeholder as feedback
+            logging.error(f"Empty feedback generated for {user_data.id} ({user_data.full_name})")
+            for_gemini.pop(DialogDataKeys.FEEDBACK_TEXT, None)
+            await dialog_manager.switch_to(Feedback.INPUT)
+            return
+
+        # the final render happens when the handler returns
+        if spare := texts[1:]:
+            await get_candidate_buffer(config).push(
+                dialog_manager.current_context().id, feedback_request_key(config, data), spare)
+        schedule_prefetch(dialog_manager, data)
+
+    except Exception as e:
+        logging.error(f"Error generating feedback for {user_data.id} ({user_data.full_name}): {e}")
+        for_gemini.pop(DialogDataKeys.FEEDBACK_TEXT, None)
+        await dialog_manager.switch_to(Feedback.INPUT)
     finally:
-        typing_task.cancel()
\ No newline at end of file
+        for_gemini[DialogDataKeys.FEEDBACK_STREAMING] = False
+
+
+# running prefetches by (dialog id, request key), at most one each
+_prefetch_tasks: dict[tuple[str, str], asyncio.Task] = {}
+
+
+def schedule_prefetch(dialog_manager: DialogManager, data: dict):
+    """Generate spare feedbacks for the regenerate button in the background (candidates.prefetch)."""
+
+    _, config, user_data = get_middleware_data(dialog_manager)
+    if not config.candidates.prefetch:
+        return
+
+    key = (dialog_manager.current_context().id, feedback_request_key(config, data))
+    if key in _prefetch_tasks:
+        return
+
+    task = asyncio.create_task(prefetch_candidates(config, user_data.id, *key, data))
+
+    _prefetch_tasks[key] = task
+    task.add_done_callback(lambda _: _prefetch_tasks.pop(key, None))
+
+
+async def cancel_prefetches() -> None:
+    """Stop the running prefetches before the clients they use are closed."""
+
+    tasks = list(_prefetch_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def prefetch_candidates(config: Config, user_id: int, dialog_id: str, input_key: str, data: dict):
+
+    buffer = get_candidate_buffer(config)
+
+    try:
+        if await buffer.size(dialog_id, input_key):
+            return
+
+        # behind everything the users are waiting for, without using up their share of the queue
+        async with get_llm_scheduler(config).slot(user_id, BACKGROUND):
+            texts = await generate_feedback_candidates(
+                config, data, config.candidates.count, use_cache=False, cache_response=False)
+
+        await buffer.push(dialog_id, input_key, texts)
+
+    except QueueFull:
+        logging.warning(f"LLM queue full, no feedback prefetched for {user_id}")
+    except Exception as e:
+        logging.error(f"Error prefetching feedback for {user_id}: {e}")
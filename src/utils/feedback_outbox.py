@@ -0,0 +1,246 @@
+import os
+import json
+import socket
+import random
+import asyncio
+import logging
+
+import httpx
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from .sheets_async import SheetsAsync
+from .feedback_writer import Row, SheetRow, sheet_row
+
+from ..enums import RedisKeys
+
+logger = logging.getLogger(__name__)
+
+GROUP = "sheets"
+MAX_RETRY_DELAY = 300.0  # seconds between drains while Sheets keeps failing
+
+
+def is_permanent(error: Exception) -> bool:
+    """A rejected request (4xx other than 408/429) fails the same way every time; anything else may pass later."""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return 400 <= status < 500 and status not in (408, 429)
+    return False
+
+
+async def enqueue_feedback(redis: Redis, tab: str, row: Row) -> None:
+    """Durably queue one feedback row for the drainer (a single XADD)."""
+    await redis.xadd(RedisKeys.FEEDBACK_OUTBOX, {"tab": tab, "row": json.dumps(row, ensure_ascii=False)})
+
+
+class FeedbackOutbox:
+    """
+    Drains the feedback Redis Stream into Sheets.
+
+    Entries are read through a consumer group in batches of up to ``max_rows``
+    and written with one SheetsAsync.append_rows call, then acked and deleted.
+    A failed write leaves the batch pending; it is reclaimed after
+    ``claim_idle_ms`` (also from consumers that died) and retried. Transient
+    failures (429, 5xx, timeouts) are retried for as long as they last, with
+    the drainer backing off exponentially up to MAX_RETRY_DELAY. Entries
+    rejected by Sheets ``max_deliveries`` times, malformed, or addressed to a
+    missing tab are moved to the dead-letter stream; ``replay_dead_letters``
+    queues them again.
+    """
+
+    def __init__(
+            self,
+            redis: Redis,
+            sheet: SheetsAsync,
+            *,
+            flush_interval: float,
+            max_rows: int,
+            claim_idle_ms: int,
+            max_deliveries: int,
+            shutdown_timeout: float):
+
+        self.redis = redis
+        self.sheet = sheet
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.claim_idle_ms = claim_idle_ms
+        self.max_deliveries = max_deliveries
+        self.shutdown_timeout = shutdown_timeout
+
+        self.stream = RedisKeys.FEEDBACK_OUTBOX.value
+        self.dead_stream = RedisKeys.FEEDBACK_OUTBOX_DEAD.value
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+
+        self._task: asyncio.Task | None = None
+        self._stopping = asyncio.Event()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Let the current batch finish (bounded by shutdown_timeout); undrained rows stay in Redis."""
+        if self._task is None:
+            return
+
+        self._stopping.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logger.error("Feedback outbox drainer did not stop in time, pending rows stay in Redis")
+        finally:
+            self._task = None
+
+    async def _run(self) -> None:
+        group_ready = False
+        failures = 0
+
+        while not self._stopping.is_set():
+            try:
+                if not group_ready:
+                    await self._ensure_group()
+                    group_ready = True
+                drained = await self._drain_once()
+                failures = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Feedback outbox drainer error: {e}")
+                group_ready = group_ready and "NOGROUP" not in str(e)
+                drained = 0
+                failures += 1
+
+            if drained < self.max_rows or failures:
+                # full jitter, so several drainers don't hit a recovering Sheets together
+                timeout = self.flush_interval if not failures else random.uniform(
+                    self.flush_interval, min(MAX_RETRY_DELAY, self.flush_interval * 2 ** failures))
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _ensure_group(self) -> None:
+        try:
+            await self.redis.xgroup_create(self.stream, GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _drain_once(self) -> int:
+        claimed = await self.redis.xautoclaim(
+            self.stream, GROUP, self.consumer,
+            min_idle_time=self.claim_idle_ms, start_id="0-0", count=self.max_rows)
+        entries = list(claimed[1])
+
+        if len(entries) < self.max_rows:
+            read = await self.redis.xreadgroup(
+                GROUP, self.consumer, {self.stream: ">"},
+                count=self.max_rows - len(entries))
+            for _, stream_entries in read:
+                entries.extend(stream_entries)
+
+        if entries:
+            await self._write(entries)
+
+        return len(entries)
+
+    async def _write(self, entries: list) -> None:
+        rows_by_tab: dict[str, list[SheetRow]] = {}
+        ids_by_tab: dict[str, list[str]] = {}
+        fields_by_id: dict[str, dict] = {}
+
+        for entry_id, fields in entries:
+            if fields is None:
+                # trimmed or deleted while pending
+                await self._ack([entry_id])
+                continue
+            fields_by_id[entry_id] = fields
+            try:
+                tab, row = fields["tab"], sheet_row(json.loads(fields["row"]))
+            except Exception as e:
+                await self._dead_letter([entry_id], fields_by_id, f"malformed entry: {e}")
+                continue
+            rows_by_tab.setdefault(tab, []).append(row)
+            ids_by_tab.setdefault(tab, []).append(entry_id)
+
+        if not rows_by_tab:
+            return
+
+        try:
+            missing = await self.sheet.append_rows(rows_by_tab)
+        except Exception as e:
+            if not is_permanent(e):
+                # the rows stay pending; _run backs off and retries them
+                raise RuntimeError(f"writing {len(fields_by_id)} feedback rows failed, they stay pending: {e}") from e
+            logger.error(f"Sheets rejected {len(fields_by_id)} feedback rows, they stay pending: {e}")
+            await self._dead_letter_exhausted(list(fields_by_id), fields_by_id, str(e))
+            return
+
+        missing_ids = [entry_id for tab in missing for entry_id in ids_by_tab[tab]]
+        if missing_ids:
+            await self._dead_letter(missing_ids, fields_by_id, "tab does not exist")
+
+        written = [entry_id for tab, ids in ids_by_tab.items() if tab not in missing for entry_id in ids]
+        if written:
+            await self._ack(written)
+
+    async def _dead_letter_exhausted(self, ids: list[str], fields_by_id: dict, error: str) -> None:
+        ordered = sorted(ids, key=lambda entry_id: tuple(map(int, entry_id.split("-"))))
+        pending = await self.redis.xpending_range(
+            self.stream, GROUP, min=ordered[0], max=ordered[-1], count=len(ids), consumername=self.consumer)
+
+        exhausted = [
+            p["message_id"] for p in pending
+            if p["times_delivered"] >= self.max_deliveries and p["message_id"] in fields_by_id
+        ]
+        if exhausted:
+            await self._dead_letter(exhausted, fields_by_id, error)
+
+    async def _dead_letter(self, ids: list[str], fields_by_id: dict, error: str) -> None:
+        logger.error(f"Moving {len(ids)} feedback rows to {self.dead_stream}: {error}")
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for entry_id in ids:
+                pipe.xadd(self.dead_stream, {**fields_by_id[entry_id], "id": entry_id, "error": error})
+            pipe.xack(self.stream, GROUP, *ids)
+            pipe.xdel(self.stream, *ids)
+            await pipe.execute()
+
+    async def _ack(self, ids: list[str]) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(self.stream, GROUP, *ids)
+            pipe.xdel(self.stream, *ids)
+            await pipe.execute()
+
+
+async def replay_dead_letters(redis: Redis, *, count: int | None = None, dry_run: bool = False) -> int:
+    """
+    Queue up to ``count`` dead-lettered feedback rows in the outbox again,
+    oldest first, and remove them from the dead-letter stream. Returns the
+    number of rows; with ``dry_run`` they are only listed.
+    """
+
+    dead_stream = RedisKeys.FEEDBACK_OUTBOX_DEAD.value
+    start = "-"
+    replayed = 0
+
+    while count is None or replayed < count:
+        batch = 100 if count is None else min(100, count - replayed)
+        entries = await redis.xrange(dead_stream, min=start, count=batch)
+        if not entries:
+            break
+        start = f"({entries[-1][0]}"
+
+        if dry_run:
+            for entry_id, fields in entries:
+                logger.info(f"{entry_id} {fields.get('tab')}: {fields.get('error')}")
+        else:
+            async with redis.pipeline(transaction=True) as pipe:
+                for entry_id, fields in entries:
+                    pipe.xadd(RedisKeys.FEEDBACK_OUTBOX, {"tab": fields["tab"], "row": fields["row"]})
+                    pipe.xdel(dead_stream, entry_id)
+                await pipe.execute()
+        replayed += len(entries)
+
+    return replayed
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from .sheets_async import SheetsAsync
+
+logger = logging.getLogger(__name__)
+
+# a feedback row as queued: JSON-friendly, the timestamp formatted with FEEDBACK_DATE_FORMAT
+Row = list[str | int | float | None]
+# a feedback row as written, the timestamp parsed back into a datetime
+SheetRow = list[str | int | float | datetime | None]
+
+FEEDBACK_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def feedback_row(discipline: str, task: str, text: str, feedback: str, like: bool, moment: datetime) -> Row:
+    return [discipline, task, text, feedback, int(like), moment.strftime(FEEDBACK_DATE_FORMAT)]
+
+
+def sheet_row(row: Row) -> SheetRow:
+    """The row with its timestamp as a datetime, so it is written as a date cell. ValueError if it is malformed."""
+    *values, date = row
+    return [*values, datetime.strptime(date, FEEDBACK_DATE_FORMAT)]
+
+
+class FeedbackWriter:
+    """
+    Write-behind buffer for feedback rows.
+
+    Rows are queued per tab and written together with SheetsAsync.append_rows
+    (one batchUpdate for all tabs) every ``flush_interval`` seconds, or as soon
+    as ``max_rows`` rows are waiting. Rows of a failed write stay queued for the
+    next flush. ``close()`` makes one last flush bounded by ``shutdown_timeout``.
+    """
+
+    def __init__(
+            self,
+            sheet: SheetsAsync,
+            *,
+            flush_interval: float,
+            max_rows: int,
+            shutdown_timeout: float):
+
+        self.sheet = sheet
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.shutdown_timeout = shutdown_timeout
+
+        self._buffer: dict[str, list[SheetRow]] = {}
+        self._pending = 0
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def add(self, tab: str, row: Row) -> None:
+        self._buffer.setdefault(tab, []).append(sheet_row(row))
+        self._pending += 1
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+        if self._pending >= self.max_rows:
+            self._full.set()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+
+            batch, self._buffer = self._buffer, {}
+            count, self._pending = self._pending, 0
+
+            try:
+                missing = await self.sheet.append_rows(batch)
+            except asyncio.CancelledError:
+                self._requeue(batch, count)
+                raise
+            except Exception as e:
+                logger.error(f"Error writing {count} feedback rows, keeping them for the next flush: {e}")
+                self._requeue(batch, count)
+                return
+
+            for tab in missing:
+                logger.error(f"Feedback tab {tab} does not exist, dropped {len(batch[tab])} rows: {batch[tab]}")
+
+    def _requeue(self, batch: dict[str, list[SheetRow]], count: int) -> None:
+        for tab, rows in batch.items():
+            self._buffer[tab] = rows + self._buffer.get(tab, [])
+        self._pending += count
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        try:
+            await asyncio.wait_for(self.flush(), timeout=self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Feedback flush timed out on shutdown, {self._pending} rows not written: {self._buffer}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+
+            await self.flush()
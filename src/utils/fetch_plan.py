@@ -0,0 +1,89 @@
+# fetch_plan.py
+import asyncio
+from typing import Dict, Iterable, List, Set, Tuple
+
+from .sheets_async import SheetsAsync
+
+
+def quote_tab(title: str) -> str:
+    """Quote a tab title for use in an A1 range."""
+    return "'" + title.replace("'", "''") + "'"
+
+
+class FetchResult:
+    """Values read by a SheetsFetchPlan, looked up by the ranges that were planned."""
+    def __init__(self):
+        self._values: Dict[Tuple[str, str], List[List[str]]] = {}
+        self._tabs: Dict[str, Dict[str, List[List[str]]]] = {}
+
+    def values(self, sheet: SheetsAsync, a1_range: str) -> List[List[str]]:
+        return self._values.get((sheet.spreadsheet_id, a1_range), [])
+
+    def tabs(self, sheet: SheetsAsync) -> Dict[str, List[List[str]]]:
+        """Values of the add_every_tab() ranges as {tab title: rows}."""
+        return self._tabs.get(sheet.spreadsheet_id, {})
+
+
+class SheetsFetchPlan:
+    """
+    Collects A1 ranges across spreadsheets and reads them with one
+    values:batchGet per spreadsheet, running the spreadsheets concurrently.
+    """
+    def __init__(self):
+        self._sheets: Dict[str, SheetsAsync] = {}
+        self._ranges: Dict[str, List[str]] = {}
+        self._every_tab: Dict[str, Tuple[str, Set[str]]] = {}
+
+    def add(self, sheet: SheetsAsync, a1_range: str) -> "SheetsFetchPlan":
+        self._sheets.setdefault(sheet.spreadsheet_id, sheet)
+        ranges = self._ranges.setdefault(sheet.spreadsheet_id, [])
+        if a1_range not in ranges:
+            ranges.append(a1_range)
+        return self
+
+    def add_every_tab(
+        self,
+        sheet: SheetsAsync,
+        cells: str,
+        *,
+        exclude: Iterable[str] = (),
+    ) -> "SheetsFetchPlan":
+        """Read `cells` (e.g. "A2:C") from every tab except `exclude`; tab titles are looked up first."""
+        self._sheets.setdefault(sheet.spreadsheet_id, sheet)
+        self._ranges.setdefault(sheet.spreadsheet_id, [])
+        self._every_tab[sheet.spreadsheet_id] = (cells, set(exclude))
+        return self
+
+    async def execute(self) -> FetchResult:
+        result = FetchResult()
+        await asyncio.gather(*(
+            self._fetch_spreadsheet(spreadsheet_id, result)
+            for spreadsheet_id in self._sheets
+        ))
+        return result
+
+    async def _fetch_spreadsheet(self, spreadsheet_id: str, result: FetchResult) -> None:
+        sheet = self._sheets[spreadsheet_id]
+        ranges = list(self._ranges[spreadsheet_id])
+
+        tab_ranges: Dict[str, str] = {}
+        if spreadsheet_id in self._every_tab:
+            cells, exclude = self._every_tab[spreadsheet_id]
+            for title in await sheet.get_sheet_index():
+                if title not in exclude:
+                    tab_ranges[f"{quote_tab(title)}!{cells}"] = title
+            ranges.extend(tab_ranges)
+
+        if not ranges:
+            return
+
+        batch = await sheet.batch_get(ranges)
+
+        # valueRanges come back in request order; the "range" field is normalized by the API
+        tabs = result._tabs.setdefault(spreadsheet_id, {})
+        for a1_range, value_range in zip(ranges, batch.get("valueRanges", [])):
+            values = value_range.get("values", [])
+            if a1_range in tab_ranges:
+                tabs[tab_ranges[a1_range]] = values
+            else:
+                result._values[(spreadsheet_id, a1_range)] = values
@@ -1,13 +1,26 @@
 import io
 import random
+import logging
+from typing import AsyncIterator, Callable
+from contextlib import asynccontextmanager, aclosing
+from pydantic import BaseModel
 from google import genai
-from google.genai.types import UploadFileConfig, GenerateContentConfig
+from google.genai.errors import ClientError
+from google.genai.types import UploadFileConfig, GenerateContentConfig, Part
 
 from functools import lru_cache
 
+from .genai_cache import ContextCacheManager
+from .genai_files import FileJanitor, VOICE_DISPLAY_NAME
+from .response_cache import ResponseCache, request_key
+from .llm_scheduler import LLMScheduler
+from .hedging import Hedger
+from .redis_registry import get_redis
+
 from ..config import Config
+from ..custom_types import VoiceFeedback
 
-from ..enums import DialogDataKeys
+from ..enums import DialogDataKeys, Database
 
 
 @lru_cache(maxsize=None)
@@ -15,9 +28,134 @@ def _get_client(api_key: str) -> genai.Client:
     return genai.Client(api_key=api_key)
 
 
-async def generate_transcript(config: Config, voice_file: io.BytesIO):
+_context_cache_instance: ContextCacheManager | None = None
+
+
+def get_context_cache(config: Config) -> ContextCacheManager:
+    """
+    Get or create a singleton ContextCacheManager on the shared Gemini client.
+    """
+    global _context_cache_instance
+    if _context_cache_instance is None:
+        _context_cache_instance = ContextCacheManager(
+            _get_client(config.gemini.api_key),
+            ttl = config.context_cache.ttl,
+            refresh_margin = config.context_cache.refresh_margin,
+            negative_ttl = config.context_cache.negative_ttl
+        )
+    return _context_cache_instance
+
+
+_file_janitor_instance: FileJanitor | None = None
+
+
+def get_file_janitor(config: Config) -> FileJanitor:
+    """
+    Get or create a singleton FileJanitor on the shared Gemini client.
+    """
+    global _file_janitor_instance
+    if _file_janitor_instance is None:
+        _file_janitor_instance = FileJanitor(
+            _get_client(config.gemini.api_key),
+            interval = config.audio.janitor_interval,
+            max_age = config.audio.orphan_age
+        )
+    return _file_janitor_instance
+
+
+_response_cache_instance: ResponseCache | None = None
+
+
+def get_response_cache(config: Config) -> ResponseCache | None:
+    """
+    Get or create a singleton ResponseCache in the temp db, None if it is disabled.
+    """
+    global _response_cache_instance
+    if not config.response_cache.enabled:
+        return None
+    if _response_cache_instance is None:
+        _response_cache_instance = ResponseCache(
+            get_redis(config, Database.TEMP, decode_responses=True),
+            ttl = config.response_cache.ttl,
+            max_entries = config.response_cache.max_entries,
+            max_value_bytes = config.response_cache.max_value_bytes
+        )
+    return _response_cache_instance
+
+
+_llm_scheduler_instance: LLMScheduler | None = None
+
+
+def get_llm_scheduler(config: Config) -> LLMScheduler:
+    """
+    Get or create the process-wide LLMScheduler.
+    """
+    global _llm_scheduler_instance
+    if _llm_scheduler_instance is None:
+        _llm_scheduler_instance = LLMScheduler(
+            max_concurrent = config.llm_scheduler.max_concurrent,
+            max_queue = config.llm_scheduler.max_queue,
+            max_per_user = config.llm_scheduler.max_per_user
+        )
+    return _llm_scheduler_instance
+
+
+# Latencies of whole responses and of first streamed chunks are far apart,
+# so each kind of call has its own Hedger and window.
+HEDGE_GENERATE = "generate"
+HEDGE_STREAM = "stream"
+
+_hedger_instances: dict[str, Hedger] = {}
+
+
+def get_hedger(config: Config, kind: str) -> Hedger:
+    """
+    Get or create the process-wide Hedger for one kind of model request.
+    """
+    if kind not in _hedger_instances:
+        _hedger_instances[kind] = Hedger(
+            percentile = config.hedging.percentile,
+            min_delay = config.hedging.min_delay,
+            max_delay = config.hedging.max_delay,
+            initial_delay = config.hedging.initial_delay,
+            window = config.hedging.window,
+            min_samples = config.hedging.min_samples
+        )
+    return _hedger_instances[kind]
+
+
+def start_genai(config: Config) -> None:
+    get_file_janitor(config).start()
+
+
+async def close_genai() -> None:
+    global _response_cache_instance, _context_cache_instance
+
+    if _file_janitor_instance is not None:
+        await _file_janitor_instance.close()
+
+    # cached contents are billed until their TTL; a restart would not reuse them
+    if _context_cache_instance is not None:
+        await _context_cache_instance.clear()
+        _context_cache_instance = None
+
+    # its client belongs to the Redis registry
+    _response_cache_instance = None
 
-    client = _get_client(config.gemini.api_key)
+
+@asynccontextmanager
+async def _audio_part(client: genai.Client, config: Config, voice_file: io.BytesIO):
+    """
+    The voice note as a request part: inline bytes when it is small enough,
+    otherwise a Files API upload that is deleted on exit.
+    """
+
+    audio = voice_file.getvalue()
+
+    # small voice notes go inline: one request instead of upload + generate
+    if len(audio) <= config.audio.inline_max_bytes:
+        yield Part.from_bytes(data=audio, mime_type="audio/ogg")
+        return
 
     voice_file.seek(0)
 
@@ -25,22 +163,61 @@ async def generate_transcript(config: Config, voice_file: io.BytesIO):
         file=voice_file,        
         config=UploadFileConfig(
             mime_type="audio/ogg",        # Telegram voice notes = OGG/Opus
-            display_name="voice.ogg" # optional, for your sanity
+            display_name=VOICE_DISPLAY_NAME # the janitor looks for this name
         ),
     )
 
+    try:
+        yield uploaded
+    finally:
+        try:
+            await client.aio.files.delete(name=uploaded.name)
+        except Exception as e:
+            # left for the janitor
+            logging.warning(f"Could not delete uploaded file {uploaded.name}: {e}")
+
+
+async def generate_transcript(config: Config, voice_file: io.BytesIO, file_unique_id: str | None = None):
+
+    client = _get_client(config.gemini.api_key)
+
+    # the same voice note (e.g. sent again after a restart) has the same file_unique_id
+    cache = get_response_cache(config) if file_unique_id else None
+    key = request_key(config.gemini.model, file_unique_id)
+    if cache is not None and (text := await cache.get("transcript", key)) is not None:
+        return text
+
     prompt = 'Generate a transcript of the speech.'
-    response = await client.aio.models.generate_content(
-        model=config.gemini.model,
-        contents=[prompt, uploaded]
-    )
+
+    async with _audio_part(client, config, voice_file) as audio:
+        response = await client.aio.models.generate_content(
+            model=config.gemini.model,
+            contents=[prompt, audio]
+        )
+
+    if cache is not None and response.text:
+        await cache.set("transcript", key, response.text)
     return response.text
 
 
+def _feedback_requests(
+        config: Config,
+        data: dict,
+        default_config: bool,
+        cache_name: str | None,
+        teacher_input: list | None = None,
+        response_schema: type[BaseModel] | None = None) -> list[tuple[GenerateContentConfig, list]]:
+    """
+    Requests to try in order: via the cached content if there is one,
+    then with the system prompt and syllabus inline.
+    """
 
-async def generate_feedback(config: Config, data: dict, default_config: bool = True):
+    if teacher_input is None:
+        teacher_input = [f"<teacher_input>{data[DialogDataKeys.TEXT_FROM_TEACHER]}</teacher_input>"]
 
-    client = _get_client(config.gemini.api_key)
+    response_config = {}
+    if response_schema is not None:
+        response_config = {"response_mime_type": "application/json", "response_schema": response_schema}
 
     if default_config:
         temperature = data[DialogDataKeys.TEMPERATURE]
@@ -48,22 +225,304 @@ async def generate_feedback(config: Config, data: dict, default_config: bool = T
     else:
         temperature = random.uniform(0.1, 1.0)
 
-    gemini_config = GenerateContentConfig(
-        system_instruction=data[DialogDataKeys.PROMPT],
-        temperature=temperature
-    )
-
     contents = [
         f"<sullabus>{data[DialogDataKeys.SYLLABUS]}</sullabus>",
         f"<discipline>{data[DialogDataKeys.DISCIPLINE_NAME]}</discipline>",
         f"<task>{data[DialogDataKeys.TASK_NAME]}</task>",
         f"<task_description>{data[DialogDataKeys.TASK_DESCRIPTION]}</task_description>",
-        f"<teacher_input>{data[DialogDataKeys.TEXT_FROM_TEACHER]}</teacher_input>",
+        *teacher_input,
     ]
 
-    response = await client.aio.models.generate_content(
-        model=config.gemini.model,
-        config=gemini_config,
-        contents=contents
-    )
-    return response.text
+    requests = []
+    if cache_name is not None:
+        # the system prompt and the syllabus are already in the cached content
+        requests.append((GenerateContentConfig(cached_content=cache_name, temperature=temperature, **response_config), contents[1:]))
+
+    requests.append((GenerateContentConfig(system_instruction=data[DialogDataKeys.PROMPT], temperature=temperature, **response_config), contents))
+    return requests
+
+
+async def _context_cache_name(config: Config, data: dict) -> str | None:
+
+    if not config.context_cache.enabled:
+        return None
+
+    return await get_context_cache(config).get(
+        config.gemini.model,
+        data[DialogDataKeys.PROMPT],
+        data[DialogDataKeys.DISCIPLINE_NAME],
+        data[DialogDataKeys.SYLLABUS])
+
+
+def _cache_rejected(e: ClientError) -> bool:
+    """
+    The request failed because of its cached content (expired, deleted or not
+    accepted), so it is worth sending inline. Anything else, a 429 above all,
+    is not: another request would only add to the load.
+    """
+
+    if e.code == 429:
+        return False
+    if e.code == 404 or e.status == "NOT_FOUND":
+        return True
+    return e.code in (400, 403) and "cached" in (e.message or "").lower()
+
+
+async def _generate(client: genai.Client, config: Config, requests: list[tuple[GenerateContentConfig, list]]):
+
+    def attempt(model: str, request: tuple):
+        return client.aio.models.generate_content(
+            model=model,
+            config=request[0],
+            contents=request[1]
+        )
+
+    for request in requests[:-1]:
+        try:
+            return await _hedged(config, HEDGE_GENERATE, requests, request, attempt)
+        except ClientError as e:
+            if not _cache_rejected(e):
+                raise
+            logging.warning(f"Cached content {request[0].cached_content} rejected, sending inline: {e}")
+            get_context_cache(config).invalidate(request[0].cached_content)
+
+    return await _hedged(config, HEDGE_GENERATE, requests, requests[-1], attempt)
+
+
+async def _hedged(
+        config: Config,
+        kind: str,
+        requests: list,
+        request: tuple,
+        attempt: Callable,
+        discard: Callable | None = None):
+    """
+    attempt(model, request), hedged when enabled by the Hedger of this kind of
+    call. A cached content belongs to the main model, so a backup on another
+    model sends everything inline. The backup takes a spare LLMScheduler slot
+    and is skipped when there is none, so hedging stays within max_concurrent.
+    """
+
+    if not config.hedging.enabled:
+        return await attempt(config.gemini.model, request)
+
+    backup_model = config.hedging.model or config.gemini.model
+    backup_request = request if backup_model == config.gemini.model else requests[-1]
+    scheduler = get_llm_scheduler(config)
+
+    async def backup():
+        async with scheduler.spare_slot():
+            return await attempt(backup_model, backup_request)
+
+    return await get_hedger(config, kind).run(
+        lambda: attempt(config.gemini.model, request),
+        backup,
+        discard,
+        scheduler.has_spare)
+
+
+def _feedback_key(config: Config, data: dict, *teacher_input: str) -> str:
+    return request_key(
+        config.gemini.model,
+        data[DialogDataKeys.PROMPT],
+        data[DialogDataKeys.TEMPERATURE],
+        data[DialogDataKeys.SYLLABUS],
+        data[DialogDataKeys.DISCIPLINE_NAME],
+        data[DialogDataKeys.TASK_NAME],
+        data[DialogDataKeys.TASK_DESCRIPTION],
+        *teacher_input)
+
+
+def feedback_request_key(config: Config, data: dict) -> str:
+    """Hash of everything that determines the feedback for the current teacher input."""
+    return _feedback_key(config, data, data[DialogDataKeys.TEXT_FROM_TEACHER])
+
+
+async def generate_feedback(config: Config, data: dict, default_config: bool = True, use_cache: bool = True):
+    """
+    use_cache=False skips the lookup (explicit regeneration), the new response is still cached.
+    """
+
+    texts = await generate_feedback_candidates(config, data, 1, default_config, use_cache)
+    return texts[0]
+
+
+async def generate_feedback_candidates(
+        config: Config,
+        data: dict,
+        count: int,
+        default_config: bool = True,
+        use_cache: bool = True,
+        cache_response: bool = True) -> list[str]:
+    """
+    Up to ``count`` alternative feedbacks from one model call; the first one is
+    what generate_feedback returns. A cached response comes back alone.
+    cache_response=False leaves the response cache alone, for texts nobody has seen yet.
+    """
+
+    client = _get_client(config.gemini.api_key)
+
+    # a random temperature is a new request every time
+    cache = get_response_cache(config) if default_config else None
+    key = feedback_request_key(config, data)
+    if cache is not None and use_cache and (text := await cache.get("feedback", key)) is not None:
+        return [text]
+
+    requests = _feedback_requests(config, data, default_config, await _context_cache_name(config, data))
+    if count > 1:
+        for gemini_config, _ in requests:
+            gemini_config.candidate_count = count
+
+    response = await _generate(client, config, requests)
+
+    texts = [response.text]
+    if count > 1:
+        texts = [
+            _candidate_text(candidate)
+            for candidate in response.candidates or []
+            if candidate.content and candidate.content.parts
+        ] or texts
+
+    if cache is not None and cache_response and texts[0]:
+        await cache.set("feedback", key, texts[0])
+    return texts
+
+
+def _candidate_text(candidate) -> str:
+    return "".join(part.text for part in candidate.content.parts if part.text)
+
+
+async def generate_voice_feedback(
+        config: Config,
+        data: dict,
+        voice_file: io.BytesIO,
+        file_unique_id: str | None = None,
+        default_config: bool = True) -> VoiceFeedback:
+    """
+    Transcript and feedback for a voice note in one structured-output request:
+    the audio takes the place of the teacher's text.
+    """
+
+    client = _get_client(config.gemini.api_key)
+
+    cache = get_response_cache(config) if file_unique_id and default_config else None
+    key = _feedback_key(config, data, "voice", file_unique_id)
+    if cache is not None and (cached := await cache.get("voice_feedback", key)) is not None:
+        return VoiceFeedback.model_validate_json(cached)
+
+    cache_name = await _context_cache_name(config, data)
+
+    async with _audio_part(client, config, voice_file) as audio:
+        teacher_input = [
+            "<teacher_input>",
+            audio,
+            "</teacher_input>",
+            "The teacher input is a voice note. Return `transcript`: a verbatim transcript of it, "
+            "and `feedback`: the feedback you would write for that input.",
+        ]
+        requests = _feedback_requests(config, data, default_config, cache_name, teacher_input, VoiceFeedback)
+
+        response = await _generate(client, config, requests)
+
+    if isinstance(response.parsed, VoiceFeedback):
+        result = response.parsed
+    else:
+        result = VoiceFeedback.model_validate_json(response.text)
+
+    if cache is not None:
+        await cache.set("voice_feedback", key, result.model_dump_json())
+    return result
+
+
+async def stream_feedback(
+        config: Config,
+        data: dict,
+        default_config: bool = True,
+        use_cache: bool = True) -> AsyncIterator[str]:
+    """
+    Same request as generate_feedback, streamed: yields the text accumulated so far.
+    A cached response is yielded at once.
+    """
+
+    async with aclosing(stream_feedback_candidates(config, data, 1, default_config, use_cache)) as stream:
+        async for texts in stream:
+            yield texts[0]
+
+
+async def stream_feedback_candidates(
+        config: Config,
+        data: dict,
+        count: int,
+        default_config: bool = True,
+        use_cache: bool = True) -> AsyncIterator[list[str]]:
+    """
+    Same request as generate_feedback_candidates, streamed: yields the texts
+    accumulated so far, the first one is what stream_feedback yields. The
+    other candidates arrive alongside it, so they are complete only when the
+    stream ends. A cached response comes back alone.
+    """
+
+    client = _get_client(config.gemini.api_key)
+
+    cache = get_response_cache(config) if default_config else None
+    key = feedback_request_key(config, data)
+    if cache is not None and use_cache and (text := await cache.get("feedback", key)) is not None:
+        yield [text]
+        return
+
+    requests = _feedback_requests(config, data, default_config, await _context_cache_name(config, data))
+    if count > 1:
+        for gemini_config, _ in requests:
+            gemini_config.candidate_count = count
+
+    async def open_stream(model: str, request: tuple):
+        # hedging races the time to the first chunk
+        stream = aiter(await client.aio.models.generate_content_stream(
+            model=model,
+            config=request[0],
+            contents=request[1]
+        ))
+        return await anext(stream, None), stream
+
+    async def close_stream(opened: tuple):
+        await opened[1].aclose()
+
+    for request in requests:
+        gemini_config = request[0]
+        texts = [""]
+        try:
+            first, stream = await _hedged(config, HEDGE_STREAM, requests, request, open_stream, close_stream)
+            if first is None:
+                return
+
+            async for chunk in _chain(first, stream):
+                if count == 1:
+                    if not chunk.text:
+                        continue
+                    texts[0] += chunk.text
+                else:
+                    candidates = [c for c in chunk.candidates or [] if c.content and c.content.parts]
+                    if not candidates:
+                        continue
+                    for candidate in candidates:
+                        index = candidate.index or 0
+                        texts.extend([""] * (index + 1 - len(texts)))
+                        texts[index] += _candidate_text(candidate)
+                yield list(texts)
+
+            if cache is not None and texts[0]:
+                await cache.set("feedback", key, texts[0])
+            return
+
+        except ClientError as e:
+            # only a rejected cache before any output is worth another attempt
+            if any(texts) or gemini_config.cached_content is None or not _cache_rejected(e):
+                raise
+            logging.warning(f"Cached content {gemini_config.cached_content} rejected, sending inline: {e}")
+            get_context_cache(config).invalidate(gemini_config.cached_content)
+
+
+async def _chain(first, rest: AsyncIterator) -> AsyncIterator:
+    yield first
+    async for item in rest:
+        yield item
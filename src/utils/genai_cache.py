@@ -0,0 +1,100 @@
+import time
+import asyncio
+import hashlib
+import logging
+
+from google import genai
+from google.genai.types import CreateCachedContentConfig, UpdateCachedContentConfig
+
+logger = logging.getLogger(__name__)
+
+
+def content_version(*parts: str) -> str:
+    return hashlib.sha1("\x00".join(parts).encode()).hexdigest()[:12]
+
+
+class ContextCacheManager:
+    """
+    Gemini cached contents for the parts of a feedback request that repeat:
+    the system prompt and the discipline syllabus.
+
+    One cache per (model, prompt version, discipline, syllabus version). Caches
+    about to expire are extended; content the API refuses to cache (e.g. below
+    the minimum token count) is remembered for ``negative_ttl`` seconds and
+    requests go out uncached meanwhile.
+    """
+
+    def __init__(
+            self,
+            client: genai.Client,
+            *,
+            ttl: int,
+            refresh_margin: int,
+            negative_ttl: int):
+
+        self.client = client
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.negative_ttl = negative_ttl
+
+        self._entries: dict[tuple, tuple[str | None, float]] = {}
+        self._locks: dict[tuple, asyncio.Lock] = {}
+
+    async def get(self, model: str, prompt: str, discipline: str, syllabus: str) -> str | None:
+        """Name of a live cached content for this prompt and syllabus, or None to send them inline."""
+
+        key = (model, content_version(prompt), discipline, content_version(syllabus))
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] - time.monotonic() > self.refresh_margin:
+            return entry[0]
+
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            entry = self._entries.get(key)
+            now = time.monotonic()
+
+            if entry is not None and entry[1] - now > self.refresh_margin:
+                return entry[0]
+
+            if entry is not None and entry[0] is not None and entry[1] > now:
+                try:
+                    await self.client.aio.caches.update(
+                        name=entry[0],
+                        config=UpdateCachedContentConfig(ttl=f"{self.ttl}s"))
+                    self._entries[key] = (entry[0], time.monotonic() + self.ttl)
+                    return entry[0]
+                except Exception as e:
+                    logger.warning(f"Could not extend context cache {entry[0]}, creating a new one: {e}")
+
+            try:
+                cached = await self.client.aio.caches.create(
+                    model=model,
+                    config=CreateCachedContentConfig(
+                        system_instruction=prompt,
+                        contents=[f"<sullabus>{syllabus}</sullabus>"],
+                        display_name=f"{discipline}:{key[1]}:{key[3]}"[:128],
+                        ttl=f"{self.ttl}s"))
+            except Exception as e:
+                logger.warning(f"Context cache not created for {discipline}, sending inline: {e}")
+                self._entries[key] = (None, time.monotonic() + self.negative_ttl + self.refresh_margin)
+                return None
+
+            self._entries[key] = (cached.name, time.monotonic() + self.ttl)
+            return cached.name
+
+    def invalidate(self, name: str) -> None:
+        """Forget a cache the API no longer knows (expired or deleted elsewhere)."""
+        for key, entry in list(self._entries.items()):
+            if entry[0] == name:
+                del self._entries[key]
+
+    async def clear(self) -> None:
+        """Delete every cache this process created."""
+        for name, _ in list(self._entries.values()):
+            if name is None:
+                continue
+            try:
+                await self.client.aio.caches.delete(name=name)
+            except Exception as e:
+                logger.warning(f"Could not delete context cache {name}: {e}")
+        self._entries.clear()
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from google import genai
+
+logger = logging.getLogger(__name__)
+
+VOICE_DISPLAY_NAME = "voice.ogg"
+
+
+class FileJanitor:
+    """
+    Deletes voice notes left in the Gemini Files API.
+
+    Uploads are deleted right after use; this catches the ones that were not
+    (crash, cancelled handler, failed delete). Only files named
+    ``VOICE_DISPLAY_NAME`` older than ``max_age`` seconds are touched, every
+    ``interval`` seconds.
+    """
+
+    def __init__(self, client: genai.Client, *, interval: int, max_age: int):
+
+        self.client = client
+        self.interval = interval
+        self.max_age = max_age
+
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def sweep(self) -> int:
+        """Delete the orphaned uploads once; returns how many were deleted."""
+
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.max_age)
+        deleted = 0
+
+        async for file in await self.client.aio.files.list():
+            if file.display_name != VOICE_DISPLAY_NAME:
+                continue
+            if file.create_time is not None and file.create_time > cutoff:
+                continue
+            try:
+                await self.client.aio.files.delete(name=file.name)
+                deleted += 1
+            except Exception as e:
+                logger.warning(f"Could not delete uploaded file {file.name}: {e}")
+
+        return deleted
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                deleted = await self.sweep()
+                if deleted:
+                    logger.info(f"Deleted {deleted} orphaned voice uploads")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"File janitor error: {e}")
+
+            await asyncio.sleep(self.interval)
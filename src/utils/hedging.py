@@ -0,0 +1,143 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Hedger:
+    """
+    Hedged requests: if the primary attempt has not finished after the
+    ``percentile``-th latency of the last ``window`` requests (clamped to
+    ``min_delay``..``max_delay``, ``initial_delay`` until ``min_samples`` are
+    known), a backup attempt starts and whichever succeeds first wins; the
+    other one is cancelled.
+
+    Samples are the primary attempt's latencies: a backup's time says nothing
+    about how long a primary takes. A primary cancelled because the backup won
+    is sampled with the time it had run by then, a lower bound, so the slow
+    tail stays in the window.
+
+    A backup is only started when ``may_hedge`` (if given) allows it, e.g.
+    while there is spare capacity; otherwise the primary is simply awaited.
+
+    ``hedge_stats`` counts requests, hedges, skipped hedges and which side won them.
+    """
+
+    def __init__(
+            self,
+            *,
+            percentile: float,
+            min_delay: float,
+            max_delay: float,
+            initial_delay: float,
+            window: int,
+            min_samples: int):
+
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+
+        self._latencies: deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.hedged = 0
+        self.skipped = 0
+        self.primary_wins = 0
+        self.backup_wins = 0
+        self.failed = 0
+
+    @property
+    def hedge_stats(self) -> Dict[str, float]:
+        """Requests, hedges and their winners; hedge_rate is the share of requests that got a backup."""
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "skipped": self.skipped,
+            "primary_wins": self.primary_wins,
+            "backup_wins": self.backup_wins,
+            "failed": self.failed,
+            "hedge_rate": self.hedged / self.requests if self.requests else 0.0,
+        }
+
+    def delay(self) -> float:
+        if len(self._latencies) < self.min_samples:
+            return self.initial_delay
+
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return min(self.max_delay, max(self.min_delay, ordered[index]))
+
+    async def run(
+            self,
+            primary: Callable[[], Awaitable[T]],
+            backup: Callable[[], Awaitable[T]],
+            discard: Callable[[T], Awaitable[None]] | None = None,
+            may_hedge: Callable[[], bool] | None = None) -> T:
+        """
+        Result of the first successful attempt. ``discard`` is awaited with the
+        result of a losing attempt that finished at the same time.
+        """
+
+        self.requests += 1
+        delay = self.delay()
+        started = time.monotonic()
+
+        first = asyncio.create_task(primary())
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and may_hedge is not None and not may_hedge():
+                self.skipped += 1
+                await asyncio.wait(tasks)
+                done = True
+
+            if done:
+                if first.exception() is not None:
+                    self.failed += 1
+                result = first.result()
+                self._latencies.append(time.monotonic() - started)
+                return result
+
+            self.hedged += 1
+            tasks.append(asyncio.create_task(backup()))
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [t for t in tasks if t in done and t.exception() is None]
+                if not winners:
+                    continue
+
+                winner = winners[0]
+                for loser in winners[1:]:
+                    if discard is not None:
+                        await discard(loser.result())
+
+                elapsed = time.monotonic() - started
+                if winner is first:
+                    self.primary_wins += 1
+                    self._latencies.append(elapsed)
+                else:
+                    self.backup_wins += 1
+                    if not first.done():
+                        # still running: it would have taken at least this long
+                        self._latencies.append(elapsed)
+
+                logger.info(
+                    f"Hedged after {delay:.1f}s, {'primary' if winner is first else 'backup'} won in {elapsed:.1f}s "
+                    f"({self.backup_wins}/{self.hedged} hedges won by the backup)")
+                return winner.result()
+
+            self.failed += 1
+            raise first.exception()
+
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
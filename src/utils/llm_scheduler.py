@@ -0,0 +1,185 @@
+import asyncio
+import logging
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# lower runs first
+FRESH = 0
+REDO = 1
+# work nobody waits for (prefetches): not counted toward max_per_user or the users' max_queue
+BACKGROUND = 2
+
+
+class QueueFull(Exception):
+    """The scheduler queue, or the user's share of it, is full."""
+
+
+class LLMScheduler:
+    """
+    Admission control for model calls.
+
+    At most ``max_concurrent`` jobs run at once. Waiting jobs are queued per
+    priority and, within a priority, per user: users take turns, one job each,
+    so a burst from one user does not hold up the others. A job is refused with
+    QueueFull when ``max_queue`` jobs are already waiting, or ``max_per_user``
+    jobs of the same user. BACKGROUND jobs run last and are counted apart, up
+    to ``max_queue`` of them, so they never make a user's own request QueueFull.
+    """
+
+    def __init__(self, *, max_concurrent: int, max_queue: int, max_per_user: int):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+
+        self._running = 0
+        self._waiting = 0
+        self._background_waiting = 0
+        self._user_waiting: Counter = Counter()
+        self._queues: dict[int, OrderedDict[int, deque[asyncio.Future]]] = {}
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    @asynccontextmanager
+    async def slot(
+            self,
+            user_id: int,
+            priority: int = FRESH,
+            on_queued: Callable[[int], Awaitable[None]] | None = None):
+        """
+        Hold a slot for the duration of the block. ``on_queued`` is awaited with
+        the queue position (1 = next) if the job has to wait.
+        """
+
+        await self._acquire(user_id, priority, on_queued)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def has_spare(self) -> bool:
+        """A slot is free and no job is waiting for one."""
+        return self._running < self.max_concurrent and self._waiting == 0
+
+    @asynccontextmanager
+    async def spare_slot(self):
+        """
+        Hold a free slot for the duration of the block without queueing for it,
+        QueueFull if there is none. For extra attempts such as hedged backups,
+        which must not delay queued jobs.
+        """
+
+        if not self.has_spare():
+            raise QueueFull(f"no spare slot: {self._running} running, {self._waiting} jobs waiting")
+
+        self._running += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, user_id: int, priority: int, on_queued) -> None:
+        if self.has_spare():
+            self._running += 1
+            return
+
+        if priority >= BACKGROUND:
+            if self._background_waiting >= self.max_queue:
+                raise QueueFull(f"{self._background_waiting} background jobs waiting")
+        elif self._waiting - self._background_waiting >= self.max_queue or self._user_waiting[user_id] >= self.max_per_user:
+            raise QueueFull(f"{self._waiting} jobs waiting, {self._user_waiting[user_id]} of user {user_id}")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(priority, OrderedDict()).setdefault(user_id, deque()).append(waiter)
+        self._count_waiting(user_id, priority, 1)
+
+        try:
+            if on_queued is not None and not waiter.done():
+                try:
+                    await on_queued(self._position(user_id, priority, waiter))
+                except Exception as e:
+                    logger.warning(f"Could not report the queue position to {user_id}: {e}")
+            await waiter
+
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just as the job gave up
+                self._release()
+            else:
+                waiter.cancel()
+                self._forget(user_id, priority, waiter)
+            raise
+
+    def _release(self) -> None:
+        self._running -= 1
+
+        while self._running < self.max_concurrent and self._waiting:
+            waiter = self._pop_next()
+            if waiter.done():
+                # cancelled in this same tick, before its job could forget it
+                continue
+            self._running += 1
+            waiter.set_result(None)
+
+    def _pop_next(self) -> asyncio.Future:
+        priority = min(p for p, users in self._queues.items() if users)
+        users = self._queues[priority]
+
+        user_id, waiters = next(iter(users.items()))
+        waiter = waiters.popleft()
+        if waiters:
+            users.move_to_end(user_id)
+        else:
+            del users[user_id]
+
+        self._count_waiting(user_id, priority, -1)
+        return waiter
+
+    def _forget(self, user_id: int, priority: int, waiter: asyncio.Future) -> None:
+        users = self._queues.get(priority, {})
+        if waiter not in users.get(user_id, ()):
+            # already taken off the queue by _release
+            return
+
+        users[user_id].remove(waiter)
+        if not users[user_id]:
+            del users[user_id]
+
+        self._count_waiting(user_id, priority, -1)
+
+    def _count_waiting(self, user_id: int, priority: int, delta: int) -> None:
+        self._waiting += delta
+        if priority >= BACKGROUND:
+            self._background_waiting += delta
+            return
+
+        self._user_waiting[user_id] += delta
+        if not self._user_waiting[user_id]:
+            del self._user_waiting[user_id]
+
+    def _position(self, user_id: int, priority: int, waiter: asyncio.Future) -> int:
+        """Place in line if nobody else arrives: earlier priorities, then the round-robin order."""
+
+        ahead = sum(
+            len(waiters)
+            for p, users in self._queues.items() if p < priority
+            for waiters in users.values())
+
+        users = self._queues[priority]
+        turn = users[user_id].index(waiter)
+        before = True
+        for other, waiters in users.items():
+            if other == user_id:
+                before = False
+                continue
+            ahead += min(len(waiters), turn + 1 if before else turn)
+
+        return ahead + turn + 1
@@ -0,0 +1,55 @@
+import hashlib
+from collections import OrderedDict
+
+from ..custom_types import UserData
+from ..enums import RedisKeys
+
+
+def profile_key(user_id: int | str) -> str:
+    return f"{RedisKeys.PROFILE.value}:{user_id}"
+
+
+def profile_log_key(user_id: int | str) -> str:
+    return f"{RedisKeys.PROFILE_LOG.value}:{user_id}"
+
+
+def fingerprint(user_data: UserData) -> str:
+    """Short digest of the fields a profile change is detected by (UserData.compare_fields)."""
+    return hashlib.sha1(repr(user_data.compare_fields()).encode()).hexdigest()[:16]
+
+
+def to_hash(user_data: UserData) -> dict[str, str]:
+    """Profile hash fields; None values are left out, booleans stored as 1/0."""
+
+    fields = {}
+    for name, value in user_data.model_dump().items():
+        if value is None:
+            continue
+        fields[name] = str(int(value)) if isinstance(value, bool) else str(value)
+    return fields
+
+
+class RecentProfiles:
+    """
+    Fingerprints of the profiles this process has stored or found unchanged,
+    least recently used dropped first. A user whose fingerprint is here needs
+    no profile check in Redis.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._fingerprints: OrderedDict[int, str] = OrderedDict()
+
+    def seen(self, user_id: int, fp: str) -> bool:
+
+        if self._fingerprints.get(user_id) != fp:
+            return False
+        self._fingerprints.move_to_end(user_id)
+        return True
+
+    def remember(self, user_id: int, fp: str) -> None:
+
+        self._fingerprints[user_id] = fp
+        self._fingerprints.move_to_end(user_id)
+        while len(self._fingerprints) > self.size:
+            self._fingerprints.popitem(last=False)
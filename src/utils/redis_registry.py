@@ -0,0 +1,109 @@
+import logging
+
+from redis.asyncio import Redis, BlockingConnectionPool
+from aiogram.fsm.storage.redis import RedisStorage, KeyBuilder
+
+from ..config import Config
+from ..enums import Database
+
+logger = logging.getLogger(__name__)
+
+
+class RedisRegistry:
+    """
+    One bounded connection pool per logical database (and response decoding),
+    shared by the FSM and user storages, the middlewares, the error handlers and
+    the background jobs. A request waits up to ``pool_timeout`` seconds for a
+    free connection instead of opening a new one.
+    """
+
+    def __init__(
+            self,
+            urls: dict[Database, str],
+            *,
+            max_connections: int,
+            pool_timeout: float,
+            socket_timeout: float,
+            health_check_interval: int):
+
+        self.urls = urls
+        self.max_connections = max_connections
+        self.pool_timeout = pool_timeout
+        self.socket_timeout = socket_timeout
+        self.health_check_interval = health_check_interval
+
+        self._clients: dict[tuple[Database, bool], Redis] = {}
+        self._storages: dict[Database, RedisStorage] = {}
+
+    def client(self, db: Database, decode_responses: bool = False) -> Redis:
+
+        key = (db, decode_responses)
+        if key not in self._clients:
+            pool = BlockingConnectionPool.from_url(
+                self.urls[db],
+                max_connections=self.max_connections,
+                timeout=self.pool_timeout,
+                socket_timeout=self.socket_timeout,
+                socket_connect_timeout=self.socket_timeout,
+                health_check_interval=self.health_check_interval,
+                decode_responses=decode_responses,
+                client_name=db.value)
+            self._clients[key] = Redis.from_pool(pool)
+        return self._clients[key]
+
+    def storage(self, db: Database, key_builder: KeyBuilder | None = None) -> RedisStorage:
+        """aiogram storage on the db's client; ``key_builder`` counts on the first call only."""
+
+        if db not in self._storages:
+            self._storages[db] = RedisStorage(self.client(db), key_builder=key_builder)
+        return self._storages[db]
+
+    async def ping(self) -> None:
+        """Check every configured db is reachable, raising the first connection error."""
+
+        for db in self.urls:
+            await self.client(db).ping()
+
+    async def close(self) -> None:
+
+        for (db, _), client in self._clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Could not close the {db.value} Redis pool: {e}")
+        self._clients.clear()
+        self._storages.clear()
+
+
+_redis_registry_instance: RedisRegistry | None = None
+
+
+def get_redis_registry(config: Config) -> RedisRegistry:
+    """
+    Get or create the process-wide RedisRegistry.
+    """
+    global _redis_registry_instance
+    if _redis_registry_instance is None:
+        _redis_registry_instance = RedisRegistry(
+            {
+                Database.FSM: config.redis.fsm,
+                Database.USERS: config.redis.users,
+                Database.TEMP: config.redis.temp,
+            },
+            max_connections = config.redis.max_connections,
+            pool_timeout = config.redis.pool_timeout,
+            socket_timeout = config.redis.socket_timeout,
+            health_check_interval = config.redis.health_check_interval
+        )
+    return _redis_registry_instance
+
+
+def get_redis(config: Config, db: Database, decode_responses: bool = False) -> Redis:
+    return get_redis_registry(config).client(db, decode_responses)
+
+
+async def close_redis() -> None:
+    global _redis_registry_instance
+    if _redis_registry_instance is not None:
+        await _redis_registry_instance.close()
+        _redis_registry_instance = None
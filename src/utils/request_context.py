@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+from typing import Any
+
+from aiogram import Bot
+from aiogram.types import User
+from aiogram.fsm.storage.redis import RedisStorage
+from fluentogram import TranslatorRunner
+
+from my_tools import DialogManagerKeys
+
+from ..custom_types import UserData
+from ..config import Config
+from ..enums import Database
+
+REQUEST_CONTEXT = "request_context"
+
+
+@dataclass(slots=True)
+class RequestContext:
+    """What handlers and getters need from the middleware data, built once per update."""
+
+    bot: Bot
+    config: Config
+    user_data: UserData
+    i18n: TranslatorRunner | None
+    fsm: RedisStorage | None
+    users: RedisStorage | None
+    temp: RedisStorage | None
+
+    @classmethod
+    def from_data(cls, data: dict[str, Any]) -> "RequestContext":
+
+        event_from_user: User = data.get(DialogManagerKeys.EVENT_FROM_USER)
+
+        return cls(
+            bot=data[DialogManagerKeys.BOT],
+            config=data.get(DialogManagerKeys.CONFIG),
+            user_data=UserData(**event_from_user.model_dump()),
+            i18n=data.get("i18n"),
+            fsm=data.get(Database.FSM.value),
+            users=data.get(Database.USERS.value),
+            temp=data.get(Database.TEMP.value))
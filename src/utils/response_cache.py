@@ -0,0 +1,70 @@
+import json
+import time
+import hashlib
+import logging
+
+from redis.asyncio import Redis
+
+from ..enums import RedisKeys
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(*parts) -> str:
+    """Hash of everything that determines a model response."""
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Exact-match cache of model responses in Redis.
+
+    Entries live ``ttl`` seconds. Responses longer than ``max_value_bytes`` are
+    not stored, and once more than ``max_entries`` are indexed the oldest ones
+    are evicted. Redis errors are logged and treated as a miss.
+    """
+
+    def __init__(
+            self,
+            redis: Redis,
+            *,
+            ttl: int,
+            max_entries: int,
+            max_value_bytes: int):
+
+        self.redis = redis
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_value_bytes = max_value_bytes
+
+        self.prefix = RedisKeys.LLM_CACHE.value
+        self.index = RedisKeys.LLM_CACHE_INDEX.value
+
+    def _key(self, kind: str, key: str) -> str:
+        return f"{self.prefix}:{kind}:{key}"
+
+    async def get(self, kind: str, key: str) -> str | None:
+        try:
+            return await self.redis.get(self._key(kind, key))
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {e}")
+            return None
+
+    async def set(self, kind: str, key: str, value: str) -> None:
+        if len(value.encode()) > self.max_value_bytes:
+            return
+
+        name = self._key(kind, key)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(name, value, ex=self.ttl)
+                pipe.zadd(self.index, {name: time.time()})
+                pipe.zcard(self.index)
+                *_, size = await pipe.execute()
+
+            if size > self.max_entries:
+                evicted = await self.redis.zpopmin(self.index, size - self.max_entries)
+                if evicted:
+                    await self.redis.delete(*(member for member, _ in evicted))
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {e}")
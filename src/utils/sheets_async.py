@@ -1,36 +1,217 @@
 # sheets_async.py
 import asyncio
+import logging
+import random
 import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
 
 import httpx
 from google.oauth2.service_account import Credentials
 from google.auth.transport.requests import Request as GAuthRequest
 
+logger = logging.getLogger(__name__)
+
 _DEFAULT_SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 _TOKEN_REFRESH_MARGIN = 60  # seconds
+_TOKEN_REFRESH_AHEAD = 300  # seconds, background renewal
+_TOKEN_RETRY_DELAY = 10  # seconds
 _RETRYABLE = {429, 500, 502, 503, 504}
+_MAX_BACKOFF = 32.0  # seconds
+_SERIAL_EPOCH = datetime(1899, 12, 30)  # day 0 of Sheets date serials
+_DATE_NUMBER_FORMAT = {"type": "DATE_TIME", "pattern": "yyyy-mm-dd hh:mm:ss"}
+
+
+def _cell(value: Union[str, int, float, bool, datetime, None]) -> Dict[str, Any]:
+    if value is None:
+        return {}
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    if isinstance(value, datetime):
+        # a serial number with a date format, like a date parsed from USER_ENTERED input
+        serial = (value.replace(tzinfo=None) - _SERIAL_EPOCH).total_seconds() / 86400
+        return {
+            "userEnteredValue": {"numberValue": serial},
+            "userEnteredFormat": {"numberFormat": _DATE_NUMBER_FORMAT},
+        }
+    return {"userEnteredValue": {"stringValue": value}}
+
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP-date), if any."""
+    value = resp.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class _TokenBucket:
+    """
+    Token bucket sized so that no 60 s window exceeds `per_minute` requests:
+    a burst of a tenth of the quota, the rest refilled evenly over the minute.
+    """
+    def __init__(self, per_minute: int):
+        self.capacity = max(1, per_minute // 10)
+        self.rate = max(per_minute - self.capacity, 1) / 60.0  # tokens per second
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # the lock keeps waiters in FIFO order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class _Quota:
+    """Read/write budgets and in-flight cap shared by every SheetsAsync of one service account."""
+    def __init__(self, read_per_minute: int, write_per_minute: int, max_in_flight: int):
+        self.read = _TokenBucket(read_per_minute)
+        self.write = _TokenBucket(write_per_minute)
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float):
+        """After a 429 every caller holds off, not just the one that got it."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def wait(self, method: str):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await (self.read if method == "GET" else self.write).acquire()
+
+
+_QUOTAS: Dict[str, _Quota] = {}
+
+
+def _get_quota(key: str, read_per_minute: int, write_per_minute: int, max_in_flight: int) -> _Quota:
+    # the first instance for a service account sets the limits
+    if key not in _QUOTAS:
+        _QUOTAS[key] = _Quota(read_per_minute, write_per_minute, max_in_flight)
+    return _QUOTAS[key]
 
 
 class _SAAuth:
-    """Handles OAuth tokens for a service account in an async-friendly way."""
+    """
+    Handles OAuth tokens for a service account in an async-friendly way.
+
+    A background task renews the token _TOKEN_REFRESH_AHEAD seconds before it
+    expires, so headers() normally returns the current header without locking
+    or waiting. The locked refresh is only a fallback (first call, refresher down).
+    """
     def __init__(self, sa_json_path: str, scopes: Optional[Sequence[str]] = None):
         self.creds = Credentials.from_service_account_file(
             sa_json_path, scopes=scopes or _DEFAULT_SCOPES
         )
         self._lock = asyncio.Lock()
+        self._header: Optional[Dict[str, str]] = None
+        self._refresher: Optional[asyncio.Task] = None
 
-    async def _ensure_valid(self):
+    def _expires_in(self) -> float:
+        if not self.creds.valid or not self.creds.expiry:
+            return 0.0
+        # google-auth keeps expiry as naive UTC
+        return self.creds.expiry.replace(tzinfo=timezone.utc).timestamp() - time.time()
+
+    async def _ensure_valid(self, margin: float = _TOKEN_REFRESH_MARGIN):
         async with self._lock:
-            now = time.time()
-            if self.creds.valid and self.creds.expiry and now < self.creds.expiry.timestamp() - _TOKEN_REFRESH_MARGIN:
+            if self._header is not None and self._expires_in() > margin:
                 return
             # refresh in a thread to avoid blocking the loop
             await asyncio.to_thread(self.creds.refresh, GAuthRequest())
+            self._header = {"Authorization": f"Bearer {self.creds.token}"}
+
+    async def _refresh_ahead(self):
+        while True:
+            try:
+                await self._ensure_valid(margin=_TOKEN_REFRESH_AHEAD)
+                delay = max(self._expires_in() - _TOKEN_REFRESH_AHEAD, _TOKEN_RETRY_DELAY)
+            except Exception as e:
+                logger.error(f"Google token refresh failed, retrying in {_TOKEN_RETRY_DELAY} s: {e}")
+                delay = _TOKEN_RETRY_DELAY
+            await asyncio.sleep(delay)
+
+    def start(self):
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_ahead())
+
+    async def close(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
 
     async def headers(self) -> Dict[str, str]:
+        self.start()
+        header = self._header
+        if header is not None and self._expires_in() > _TOKEN_REFRESH_MARGIN:
+            return header
         await self._ensure_valid()
-        return {"Authorization": f"Bearer {self.creds.token}"}
+        return self._header
+
+
+_SHARED_CLIENT: Optional[httpx.AsyncClient] = None
+_SHARED_AUTH: Dict[tuple, _SAAuth] = {}
+
+
+def get_shared_client(*, timeout: float = 30.0, max_connections: int = 8) -> httpx.AsyncClient:
+    """
+    One keep-alive pool for every SheetsAsync. With HTTP/2 all requests to
+    sheets.googleapis.com are multiplexed over a single TLS connection.
+    The first caller sets timeout and pool size.
+    """
+    global _SHARED_CLIENT
+    if _SHARED_CLIENT is None or _SHARED_CLIENT.is_closed:
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=120.0,
+        )
+        try:
+            _SHARED_CLIENT = httpx.AsyncClient(http2=True, timeout=timeout, limits=limits)
+        except ImportError:
+            logger.warning("h2 is not installed, Sheets requests fall back to HTTP/1.1")
+            _SHARED_CLIENT = httpx.AsyncClient(timeout=timeout, limits=limits)
+    return _SHARED_CLIENT
+
+
+def get_shared_auth(sa_json_path: str, scopes: Optional[Sequence[str]] = None) -> _SAAuth:
+    """One credential object (and token refresh) per service account file and scopes."""
+    key = (sa_json_path, tuple(scopes or _DEFAULT_SCOPES))
+    if key not in _SHARED_AUTH:
+        _SHARED_AUTH[key] = _SAAuth(sa_json_path, scopes or _DEFAULT_SCOPES)
+    return _SHARED_AUTH[key]
+
+
+async def close_shared_resources():
+    global _SHARED_CLIENT
+    if _SHARED_CLIENT is not None:
+        await _SHARED_CLIENT.aclose()
+        _SHARED_CLIENT = None
+    for auth in _SHARED_AUTH.values():
+        await auth.close()
+    _SHARED_AUTH.clear()
 
 
 class SheetsAsync:
@@ -43,28 +224,71 @@ class SheetsAsync:
         scopes: Optional[Sequence[str]] = None,
         timeout: float = 30.0,
         client: Optional[httpx.AsyncClient] = None,
+        auth: Optional[_SAAuth] = None,
         retries: int = 5,
         backoff_base: float = 0.5,
+        read_per_minute: int = 60,
+        write_per_minute: int = 60,
+        max_in_flight: int = 8,
+        tab_index_ttl: float = 300.0,
     ):
         self.base = "https://sheets.googleapis.com/v4/spreadsheets"
         self.spreadsheet_id = spreadsheet_id
-        self.auth = _SAAuth(sa_json_path, scopes or _DEFAULT_SCOPES)
-        self._own_client = client is None
-        self.client = client or httpx.AsyncClient(timeout=timeout)
+        # by default all instances share one connection pool and one token per service account
+        self.auth = auth or get_shared_auth(sa_json_path, scopes)
+        self.client = client or get_shared_client(timeout=timeout, max_connections=max_in_flight)
         self.retries = retries
         self.backoff_base = backoff_base
+        # Google counts quota per service account, so instances sharing one share the budget
+        self.quota = _get_quota(sa_json_path, read_per_minute, write_per_minute, max_in_flight)
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self.coalesced_hits = 0
+        self.coalesced_misses = 0
+        self.tab_index_ttl = tab_index_ttl
+        self._tab_index: Optional[Dict[str, int]] = None
+        self._tab_index_at = 0.0
 
     async def close(self):
-        if self._own_client:
-            await self.client.aclose()
+        """No-op: the shared client and credentials are closed by close_shared_resources()."""
 
-    # ---- internal request with retries ----
+    @property
+    def coalesce_stats(self) -> Dict[str, int]:
+        """Identical concurrent GETs served by an already running request (hits) vs sent (misses)."""
+        return {"hits": self.coalesced_hits, "misses": self.coalesced_misses}
+
+    # ---- single-flight for reads ----
     async def _request(self, method: str, url: str, **kwargs) -> Any:
-        headers = kwargs.pop("headers", {})
-        headers.update(await self.auth.headers())
+        if method != "GET":
+            return await self._send(method, url, **kwargs)
+
+        params = kwargs.get("params")
+        if isinstance(params, dict):
+            params = sorted(params.items())
+        key = (self.spreadsheet_id, method, url, tuple(params or ()))
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.coalesced_misses += 1
+            task = asyncio.ensure_future(self._send(method, url, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._inflight.pop(key, None) if self._inflight.get(key) is t else None)
+        else:
+            self.coalesced_hits += 1
+
+        # callers share the parsed JSON and must not mutate it;
+        # shield so one cancelled caller doesn't cancel the request for the others
+        return await asyncio.shield(task)
+
+    # ---- internal request with retries ----
+    async def _send(self, method: str, url: str, **kwargs) -> Any:
+        extra_headers = kwargs.pop("headers", {})
 
         for attempt in range(self.retries):
-            resp = await self.client.request(method, url, headers=headers, **kwargs)
+            await self.quota.wait(method)
+            # fetched per attempt: a long retry sequence can outlive the token
+            headers = {**extra_headers, **await self.auth.headers()}
+            async with self.quota.in_flight:
+                resp = await self.client.request(method, url, headers=headers, **kwargs)
             if resp.status_code < 400:
                 # Sheets returns JSON on success
                 if resp.headers.get("content-type", "").startswith("application/json"):
@@ -72,7 +296,13 @@ class SheetsAsync:
                 return resp.text
 
             if resp.status_code in _RETRYABLE:
-                await asyncio.sleep((2 ** attempt) * self.backoff_base)
+                delay = _retry_after(resp)
+                if delay is None:
+                    # full jitter, so concurrent callers don't retry in lockstep
+                    delay = random.uniform(0, min(_MAX_BACKOFF, (2 ** attempt) * self.backoff_base))
+                if resp.status_code == 429:
+                    self.quota.pause(delay)
+                await asyncio.sleep(delay)
                 continue
 
             # raise with body for debugging
@@ -126,7 +356,37 @@ class SheetsAsync:
     async def batch_update(self, requests: List[Dict[str, Any]]) -> Dict[str, Any]:
         url = f"{self.base}/{self.spreadsheet_id}:batchUpdate"
         body = {"requests": requests}
-        return await self._request("POST", url, json=body)
+        res = await self._request("POST", url, json=body)
+        self._update_tab_index(requests, res.get("replies", []))
+        return res
+
+    async def append_rows(
+        self,
+        rows_by_title: Dict[str, List[List[Union[str, int, float, bool, datetime, None]]]],
+    ) -> List[str]:
+        """
+        Append rows to several tabs in one batchUpdate (one appendCells per tab).
+        Values are written as typed cells, not parsed like USER_ENTERED input;
+        datetime values become date cells (wall time, the tzinfo is dropped).
+        Returns the titles that do not exist; their rows are not written.
+        """
+        index = await self.get_sheet_index()
+        if any(title not in index for title in rows_by_title):
+            # the tab may have been added since the index was cached
+            index = await self.get_sheet_index(refresh=True)
+        missing = [title for title in rows_by_title if title not in index]
+        reqs = [
+            {"appendCells": {
+                "sheetId": index[title],
+                "rows": [{"values": [_cell(v) for v in row]} for row in rows],
+                "fields": "userEnteredValue,userEnteredFormat.numberFormat",
+            }}
+            for title, rows in rows_by_title.items()
+            if title in index and rows
+        ]
+        if reqs:
+            await self.batch_update(reqs)
+        return missing
 
     # ---- Convenience helpers ----
     async def get_spreadsheet(self, *, include_grid_data: bool = False) -> Dict[str, Any]:
@@ -134,12 +394,44 @@ class SheetsAsync:
         params = {"includeGridData": str(include_grid_data).lower()}
         return await self._request("GET", url, params=params)
 
+    async def get_sheet_index(self, *, refresh: bool = False) -> Dict[str, int]:
+        """
+        Return {tab title: sheetId}. Fetched with a narrow fields mask and cached
+        for tab_index_ttl seconds; tabs added or deleted through batch_update
+        are applied to the cache without a refetch.
+        """
+        fresh = time.monotonic() - self._tab_index_at < self.tab_index_ttl
+        if self._tab_index is None or refresh or not fresh:
+            url = f"{self.base}/{self.spreadsheet_id}"
+            params = {"fields": "sheets.properties(sheetId,title)"}
+            meta = await self._request("GET", url, params=params)
+            self._tab_index = {
+                s["properties"]["title"]: s["properties"]["sheetId"]
+                for s in meta.get("sheets", [])
+            }
+            self._tab_index_at = time.monotonic()
+        return dict(self._tab_index)
+
+    def invalidate_tab_index(self):
+        self._tab_index = None
+
+    def _update_tab_index(self, requests: List[Dict[str, Any]], replies: List[Dict[str, Any]]):
+        if self._tab_index is None:
+            return
+        for req, reply in zip(requests, replies):
+            if "addSheet" in reply or "duplicateSheet" in reply:
+                props = (reply.get("addSheet") or reply.get("duplicateSheet"))["properties"]
+                self._tab_index[props["title"]] = props["sheetId"]
+            elif "deleteSheet" in req:
+                sheet_id = req["deleteSheet"]["sheetId"]
+                self._tab_index = {t: sid for t, sid in self._tab_index.items() if sid != sheet_id}
+            elif "updateSheetProperties" in req:
+                # a rename: cheaper to refetch than to track the fields mask
+                self._tab_index = None
+                return
+
     async def get_sheet_id_by_title(self, title: str) -> Optional[int]:
-        meta = await self.get_spreadsheet()
-        for s in meta.get("sheets", []):
-            if s["properties"]["title"] == title:
-                return s["properties"]["sheetId"]
-        return None
+        return (await self.get_sheet_index()).get(title)
 
     async def ensure_sheet(self, title: str) -> int:
         """Create the tab if missing; return sheetId."""
@@ -3,14 +3,12 @@ import re
 import asyncio
 
 from aiogram import Bot
-from aiogram.types import User
 from aiogram.fsm.state import State
 from aiogram_dialog import DialogManager
 
-from my_tools import DialogManagerKeys
-
 from ..custom_types import UserData
 from ..config import Config
+from .request_context import RequestContext, REQUEST_CONTEXT
 
 
 
@@ -25,14 +23,22 @@ async def send_typing_action(chat_id: int, bot: Bot, delay: float = 1.0):
 
 
 
+def get_request_context(dialog_manager: DialogManager) -> RequestContext:
+    """The context RequestContextMiddleware built for this update, or a new one outside of it."""
+
+    context: RequestContext | None = dialog_manager.middleware_data.get(REQUEST_CONTEXT)
+    if context is None:
+        context = RequestContext.from_data(dialog_manager.middleware_data)
+        dialog_manager.middleware_data[REQUEST_CONTEXT] = context
+
+    return context
+
+
 def get_middleware_data(dialog_manager: DialogManager) -> tuple[Bot, Config, UserData]:
 
-    bot: Bot = dialog_manager.middleware_data[DialogManagerKeys.BOT]
-    config: Config = dialog_manager.middleware_data.get(DialogManagerKeys.CONFIG)
-    event_from_user: User = dialog_manager.middleware_data.get(DialogManagerKeys.EVENT_FROM_USER)
-    user_data: UserData = UserData(**event_from_user.model_dump())
+    context: RequestContext = get_request_context(dialog_manager)
 
-    return bot, config, user_data
+    return context.bot, context.config, context.user_data
 
 
 def get_current_state(dialog_manager: DialogManager) -> State:
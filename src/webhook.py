@@ -0,0 +1,148 @@
+import signal
+import asyncio
+import logging
+from typing import Any
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from src.config import Config
+from src.utils.redis_registry import get_redis_registry
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """
+    Answers Telegram right away and processes the update in the background, at
+    most ``max_tasks`` at a time. An update that finds no free slot within
+    ``queue_timeout`` seconds gets a 503, and Telegram delivers it again later.
+    """
+
+    def __init__(
+            self,
+            dispatcher: Dispatcher,
+            bot: Bot,
+            *,
+            secret_token: str,
+            max_tasks: int,
+            queue_timeout: float,
+            shutdown_timeout: float,
+            **data: Any):
+
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.max_tasks = max_tasks
+        self.queue_timeout = queue_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self._slots = asyncio.Semaphore(max_tasks)
+        self.stats = {"accepted": 0, "rejected": 0, "failed": 0}
+
+    @property
+    def running(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+
+        update = await request.json(loads=bot.session.json_loads)
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            logger.warning(f"No free slot for update {update.get('update_id')} in {self.queue_timeout}s, Telegram will retry")
+            return web.Response(status=503, text="Busy")
+
+        task = asyncio.create_task(self._feed(bot, update))
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._background_feed_update_tasks.discard)
+        self.stats["accepted"] += 1
+
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def _feed(self, bot: Bot, update: dict) -> None:
+
+        try:
+            await self._background_feed_update(bot, update)
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"Error processing update {update.get('update_id')}: {e}")
+        finally:
+            self._slots.release()
+
+    async def close(self) -> None:
+        """Let running updates finish; the bot session is closed by its owner."""
+
+        tasks = list(self._background_feed_update_tasks)
+        if not tasks:
+            return
+
+        _, pending = await asyncio.wait(tasks, timeout=self.shutdown_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"{len(pending)} updates cancelled on shutdown")
+
+
+def build_webhook_app(bot: Bot, dp: Dispatcher, config: Config, **data: Any) -> web.Application:
+    """
+    aiohttp application taking updates on config.webhook.path and answering
+    readiness checks on config.webhook.ready_path. ``data`` goes to the handlers
+    like the keyword arguments of start_polling.
+    """
+
+    app = web.Application()
+
+    handler = BoundedRequestHandler(
+        dp,
+        bot,
+        secret_token=config.webhook.secret_token,
+        max_tasks=config.webhook.max_tasks,
+        queue_timeout=config.webhook.queue_timeout,
+        shutdown_timeout=config.webhook.shutdown_timeout,
+        config=config,
+        **data)
+    handler.register(app, path=config.webhook.path)
+    setup_application(app, dp, bot=bot, config=config, **data)
+
+    async def ready(request: web.Request) -> web.Response:
+
+        body = {"running": handler.running, "max_tasks": handler.max_tasks, **handler.stats}
+        try:
+            await get_redis_registry(config).ping()
+        except Exception as e:
+            return web.json_response({**body, "ready": False, "error": f"redis: {e}"}, status=503)
+
+        return web.json_response({**body, "ready": True})
+
+    app.router.add_get(config.webhook.ready_path, ready)
+    app["handler"] = handler
+
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, config: Config, **data: Any) -> None:
+    """
+    Serve the webhook until SIGTERM or SIGINT (or cancellation), then shut the
+    server down, letting running updates finish, like start_polling does.
+    """
+
+    app = build_webhook_app(bot, dp, config, **data)
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    signals = (signal.SIGTERM, signal.SIGINT)
+    for sig in signals:
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await web.TCPSite(runner, config.webhook.host, config.webhook.port).start()
+        logger.warning(f"Webhook server listening on {config.webhook.host}:{config.webhook.port}{config.webhook.path}")
+        await stop.wait()
+        logger.warning("Stopping the webhook server")
+    finally:
+        for sig in signals:
+            loop.remove_signal_handler(sig)
+        await runner.cleanup()